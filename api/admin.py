@@ -1,5 +1,6 @@
 from django.contrib import admin, messages
 from django.db import models
+from django.utils import timezone
 
 from .models import (
     SimpleUser,
@@ -8,8 +9,15 @@ from .models import (
     Entrance,
     Apartment,
     Device,
+    DeviceEvent,
     MAX_ENTRANCES,
+    ENTRANCE_KINDS,
+    GLOBAL_KINDS,
+    SOURCE_ADMIN,
 )
+from .journal import acting_as, actor_of, journal
+from .registry import registry
+from .search import search_index, APARTMENT, RESIDENT
 
 # =========================
 # USERS
@@ -91,6 +99,7 @@ class ResidentProfileAdmin(admin.ModelAdmin):
         "car_number",
         "phone",
     )
+    list_select_related = ("user",)
 
     actions = ["mark_approved", "mark_not_approved"]
 
@@ -117,9 +126,16 @@ class ResidentProfileAdmin(admin.ModelAdmin):
     )
     readonly_fields = ("created_at", "updated_at")
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = search_index.search_ids(search_term, RESIDENT)
+        return queryset.filter(pk__in=ids), False
+
     def get_user_name(self, obj):
         return f"{obj.user.name or obj.user.login}"
     get_user_name.short_description = "Пользователь"
+    get_user_name.admin_order_field = "user__name"
 
     @admin.action(description="✅ Одобрить выбранные")
     def mark_approved(self, request, qs):
@@ -148,6 +164,16 @@ class ApartmentInline(admin.TabularInline):
     fields = ("number", "owner_name", "is_blocked")
 
 
+class EntranceListFilter(admin.RelatedFieldListFilter):
+    """Варианты фильтра одним запросом: str(Entrance) обращается к дому."""
+
+    def field_choices(self, field, request, model_admin):
+        return [
+            (entrance.pk, str(entrance))
+            for entrance in Entrance.objects.select_related("house")
+        ]
+
+
 @admin.register(House)
 class HouseAdmin(admin.ModelAdmin):
     list_display = ("number", "get_entrances_count", "get_apartments_count")
@@ -160,21 +186,29 @@ class HouseAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # счётчики одним запросом со списком, а не по запросу на строку
+        return super().get_queryset(request).annotate(
+            entrances_count=models.Count("entrances", distinct=True),
+            apartments_count=models.Count("entrances__apartments", distinct=True),
+        )
+
     def get_entrances_count(self, obj):
-        return obj.entrances.count()
+        return obj.entrances_count
     get_entrances_count.short_description = "Подъездов"
+    get_entrances_count.admin_order_field = "entrances_count"
 
     def get_apartments_count(self, obj):
-        return obj.entrances.aggregate(
-            total=models.Count("apartments")
-        )["total"]
+        return obj.apartments_count
     get_apartments_count.short_description = "Квартир"
+    get_apartments_count.admin_order_field = "apartments_count"
 
 
 @admin.register(Entrance)
 class EntranceAdmin(admin.ModelAdmin):
     list_display = ("__str__", "house", "number", "get_apartments_count")
     list_filter = ("house",)
+    list_select_related = ("house",)
     inlines = (ApartmentInline,)
 
     fieldsets = (
@@ -183,15 +217,22 @@ class EntranceAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            apartments_count=models.Count("apartments"),
+        )
+
     def get_apartments_count(self, obj):
-        return obj.apartments.count()
+        return obj.apartments_count
     get_apartments_count.short_description = "Квартир"
+    get_apartments_count.admin_order_field = "apartments_count"
 
 
 @admin.register(Apartment)
 class ApartmentAdmin(admin.ModelAdmin):
     list_display = ("__str__", "entrance", "owner_name", "is_blocked")
-    list_filter = ("entrance__house", "entrance", "is_blocked", "created_at")
+    list_filter = ("entrance__house", ("entrance", EntranceListFilter), "is_blocked", "created_at")
+    list_select_related = ("entrance__house",)
     search_fields = ("number", "owner_name")
 
     fieldsets = (
@@ -211,6 +252,12 @@ class ApartmentAdmin(admin.ModelAdmin):
     )
     readonly_fields = ("created_at", "updated_at")
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = search_index.search_ids(search_term, APARTMENT)
+        return queryset.filter(pk__in=ids), False
+
 
 # =========================
 # DEVICES
@@ -218,16 +265,17 @@ class ApartmentAdmin(admin.ModelAdmin):
 
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
-    list_display = ("__str__", "get_kind_display", "entrance_no", "state", "updated_at")
+    list_display = ("__str__", "house", "get_kind_display", "entrance_no", "state", "updated_at")
     list_editable = ("state",)
-    list_filter = ("kind", "entrance_no", "state", "updated_at")
-    ordering = ("entrance_no", "kind")
+    list_filter = ("house", "kind", "entrance_no", "state", "updated_at")
+    list_select_related = ("house",)
+    ordering = ("house__number", "entrance_no", "kind")
 
     actions = ["make_on", "make_off", "seed_defaults"]
 
     fieldsets = (
         ("Параметры", {
-            "fields": ("kind", "entrance_no", "state")
+            "fields": ("house", "kind", "entrance_no", "state")
         }),
         ("История", {
             "fields": ("updated_at",),
@@ -236,33 +284,78 @@ class DeviceAdmin(admin.ModelAdmin):
     )
     readonly_fields = ("updated_at",)
 
+    # журнал пишется и в on_commit сигналов — уже после save_model, поэтому кто — на весь view
+    def changeform_view(self, request, *args, **kwargs):
+        with acting_as(actor_of(request, request.user)):
+            return super().changeform_view(request, *args, **kwargs)
+
+    def changelist_view(self, request, *args, **kwargs):
+        with acting_as(actor_of(request, request.user)):
+            return super().changelist_view(request, *args, **kwargs)
+
+    def _switch(self, qs, state):
+        # журнал — только для реально переключённых устройств
+        changed = list(qs.exclude(state=state).values_list("pk", flat=True))
+        # updated_at — по нему правку видят кэши других процессов (api/changes.py)
+        updated = qs.update(state=state, updated_at=timezone.now())
+        for pk in changed:
+            journal.record(pk, state, SOURCE_ADMIN)
+        registry.invalidate()
+        return updated
+
     @admin.action(description="🟢 Включить выбранные")
     def make_on(self, request, qs):
-        updated = qs.update(state=True)
+        updated = self._switch(qs, True)
         self.message_user(request, f"Включено: {updated}", level=messages.SUCCESS)
 
     @admin.action(description="🔴 Выключить выбранные")
     def make_off(self, request, qs):
-        updated = qs.update(state=False)
+        updated = self._switch(qs, False)
         self.message_user(request, f"Выключено: {updated}", level=messages.WARNING)
 
     @admin.action(description="🔄 Генерировать устройства по умолчанию")
     def seed_defaults(self, request, qs):
-        created = 0
-
-        # Двери и лифты для каждого подъезда
-        for no in range(1, MAX_ENTRANCES + 1):
-            for kind in ("door", "lift_pass", "lift_gruz"):
-                _, was = Device.objects.get_or_create(kind=kind, entrance_no=no)
-                created += int(was)
-
-        # Калитки и паркинг (без привязки к подъезду)
-        for kind in ("kalitka1", "kalitka2", "kalitka3", "kalitka4", "parking"):
-            _, was = Device.objects.get_or_create(kind=kind, entrance_no=None)
-            created += int(was)
+        # подъезды всех домов; домов нет — старый набор без дома на MAX_ENTRANCES подъездов
+        entrances = {}
+        for house_id, no in Entrance.objects.order_by().values_list("house_id", "number"):
+            entrances.setdefault(house_id, []).append(no)
+        for house_id in House.objects.order_by().values_list("pk", flat=True):
+            entrances.setdefault(house_id, [])
+        if not entrances:
+            entrances[None] = range(1, MAX_ENTRANCES + 1)
+
+        devices = []
+        for house_id, numbers in entrances.items():
+            # Двери и лифты для каждого подъезда
+            for no in numbers:
+                devices += [Device(house_id=house_id, kind=kind, entrance_no=no) for kind in ENTRANCE_KINDS]
+            # Калитки и паркинг (без привязки к подъезду)
+            devices += [Device(house_id=house_id, kind=kind) for kind in GLOBAL_KINDS]
+
+        before = Device.objects.count()
+        # существующие устройства пропускает уникальный индекс device_unique_place
+        Device.objects.bulk_create(devices, batch_size=500, ignore_conflicts=True)
+        created = Device.objects.count() - before
+        # bulk_create не шлёт сигналов — новые устройства подхватываем перечитыванием
+        registry.invalidate()
 
         self.message_user(
             request,
             f"✅ Создано новых устройств: {created}",
             level=messages.SUCCESS
         )
+
+
+@admin.register(DeviceEvent)
+class DeviceEventAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "device", "state", "source", "actor")
+    list_filter = ("source", "state", "device__kind", "created_at")
+    search_fields = ("actor",)
+    list_select_related = ("device__house",)
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
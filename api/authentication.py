@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import jwt
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+
+from .models import SimpleUser, ResidentProfile
+from .routers import primary
+
+TOKEN_ALGORITHM = "HS256"
+
+
+# ---------- TOKENS ----------
+
+def issue_token(user):
+    """Короткоживущий подписанный токен для SimpleUser: (token, expires_in секунд)."""
+    now = timezone.now()
+    lifetime = settings.AUTH_TOKEN_LIFETIME
+    payload = {
+        "uid": user.pk,
+        "role": user.role,
+        "iat": now,
+        "exp": now + lifetime,
+    }
+    token = jwt.encode(payload, settings.SECRET_KEY, algorithm=TOKEN_ALGORITHM)
+    return token, int(lifetime.total_seconds())
+
+
+def token_payload(request):
+    """Проверенный payload Bearer-токена; None — заголовка Bearer нет."""
+    header = authentication.get_authorization_header(request).split()
+    if not header or header[0].lower() != TokenAuthentication.keyword.lower().encode():
+        return None
+    if len(header) != 2:
+        raise exceptions.AuthenticationFailed("Неверный заголовок Authorization")
+    try:
+        return jwt.decode(
+            header[1],
+            settings.SECRET_KEY,
+            algorithms=[TOKEN_ALGORITHM],
+            options={"require": ["exp", "uid"]},
+        )
+    except jwt.ExpiredSignatureError:
+        raise exceptions.AuthenticationFailed("Срок действия токена истёк")
+    except jwt.InvalidTokenError:
+        raise exceptions.AuthenticationFailed("Недействительный токен")
+
+
+def token_user_id(request):
+    """id пользователя по действующему токену, без БД; иначе None (публичные view не отвечают 401)."""
+    try:
+        payload = token_payload(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    return payload and payload["uid"]
+
+
+# ---------- IDENTITY ----------
+
+@dataclass(frozen=True)
+class Identity:
+    """То, что нужно view о пользователе, без обращения к моделям."""
+
+    id: int
+    login: str
+    name: str
+    role: str
+    has_parking: bool
+    approval_status: str | None = None
+    house_number: int | None = None
+    entrance_no: int | None = None
+    apartment_no: str | None = None
+
+    is_authenticated = True
+    is_anonymous = False
+
+    @classmethod
+    def from_user(cls, user):
+        try:
+            profile = user.profile
+        except ResidentProfile.DoesNotExist:
+            profile = None
+        return cls(
+            id=user.pk,
+            login=user.login,
+            name=user.name,
+            role=user.role,
+            has_parking=user.has_parking,
+            approval_status=profile and profile.approval_status,
+            house_number=profile and profile.house_number,
+            entrance_no=profile and profile.entrance_no,
+            apartment_no=profile and profile.apartment_no,
+        )
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class IdentityCache:
+    """
+    LRU-кэш Identity по id пользователя с TTL.
+    Сбрасывается сигналами при изменении SimpleUser / ResidentProfile;
+    TTL подхватывает правки, сделанные в других процессах.
+    """
+
+    def __init__(self, max_size=10_000):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # user_id -> (identity, expires_at)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is not None and item[1] > now:
+                self._items.move_to_end(user_id)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+
+        with primary():
+            user = (
+                SimpleUser.objects.select_related("profile")
+                .filter(pk=user_id, is_active=True)
+                .first()
+            )
+        if user is None:
+            self.invalidate(user_id)
+            return None
+
+        identity = Identity.from_user(user)
+        with self._lock:
+            self._items[user_id] = (identity, now + settings.AUTH_IDENTITY_CACHE_TTL)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+identity_cache = IdentityCache()
+
+
+# ---------- DRF ----------
+
+class TokenAuthentication(authentication.BaseAuthentication):
+    """Authorization: Bearer <token> → request.user = Identity (из кэша)."""
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        payload = token_payload(request)
+        if payload is None:
+            return None
+        identity = identity_cache.get(payload["uid"])
+        if identity is None:
+            raise exceptions.AuthenticationFailed("Пользователь не найден или отключён")
+        return identity, payload
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
+
+
+# Только для view, которым нужен пользователь. Публичные view (устройства, списки)
+# остаются на умолчаниях DRF и заголовок Bearer не читают: просроченный токен
+# у контроллера или приложения не должен превращать их ответ в 401.
+IDENTITY_AUTHENTICATION = [
+    TokenAuthentication,
+    authentication.SessionAuthentication,
+    authentication.BasicAuthentication,
+]
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .routers import primary
+
+
+class ChangeProbe:
+    """
+    Не поменяли ли таблицы кэша другие процессы (воркеры gunicorn, manage.py, shell).
+
+    Сигналы видны только своему процессу, поэтому кэши в памяти (registry,
+    справочник, поиск) раз в PROCESS_CACHE_CHECK_INTERVAL секунд сравнивают
+    отпечаток таблиц — fingerprint(): несколько агрегатов (count, max(pk),
+    max(updated_at)...) — с отпечатком на момент загрузки. Свои правки кэш
+    применяет сам (сигналы, registry) и сразу запоминает новый отпечаток —
+    mark(), так что перечитывание — только по чужим. Чужая правка, попавшая
+    между проверкой и своей, при этом считается своей: её увидит следующая
+    чужая правка или invalidate(). Пустой интервал — проверок нет (один процесс).
+    """
+
+    def __init__(self, fingerprint):
+        self._fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._seen = None
+        self._checked = None  # monotonic последней проверки
+
+    @property
+    def interval(self):
+        return settings.PROCESS_CACHE_CHECK_INTERVAL or None
+
+    def due(self):
+        """Пора проверять (дёшево, без БД)."""
+        interval = self.interval
+        return interval is not None and (self._checked is None or time.monotonic() - self._checked >= interval)
+
+    def mark(self):
+        """Запомнить отпечаток — перед загрузкой кэша из БД и после своих правок в нём."""
+        if self.interval is None:
+            return
+        with self._lock:
+            self._take()
+
+    def changed(self):
+        """True — таблицы поменялись с прошлой проверки или загрузки; запрос к БД — только если due()."""
+        if not self.due():
+            return False
+        with self._lock:
+            if not self.due():
+                return False
+            seen = self._seen
+            return seen is not None and self._take() != seen
+
+    def _take(self):
+        # под замком
+        with primary():
+            self._seen = self._fingerprint()
+        self._checked = time.monotonic()
+        return self._seen
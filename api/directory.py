@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.db.models import Count, Max, Sum
+from rest_framework.renderers import JSONRenderer
+
+from .changes import ChangeProbe
+from .models import House, Entrance, Apartment
+from .routers import primary
+
+
+class DirectoryCache:
+    """
+    Дерево Дом → Подъезд → Квартира, готовое к отдаче (JSON-байты).
+
+    Собирается тремя запросами (по одному на таблицу) и хранится до смены
+    версии; версию поднимают сигналы House / Entrance / Apartment и
+    ChangeProbe (правки других процессов).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # от времени запуска, чтобы ETag не повторялись после рестарта
+        self._version = int(time.time() * 1000)
+        self._cached = (None, None)  # (version, bytes)
+        self._probe = ChangeProbe(_fingerprint)
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def refresh(self):
+        """Поднять версию, если таблицы поменяли другие процессы; текущая версия."""
+        if self._probe.changed():
+            self.invalidate()
+        return self._version
+
+    def get(self):
+        """(version, JSON-байты)."""
+        version = self.refresh()
+        cached, content = self._cached
+        if cached == version:
+            return version, content
+
+        self._probe.mark()
+        content = JSONRenderer().render(self.build())
+        with self._lock:
+            # за время сборки могли быть правки — тогда кэш уже устарел
+            if version == self._version:
+                self._cached = (version, content)
+        return version, content
+
+    @staticmethod
+    @primary()
+    def build():
+        houses = {
+            pk: {"id": pk, "number": number, "entrances": []}
+            for pk, number in House.objects.order_by("number").values_list("pk", "number")
+        }
+        entrances = {}
+        for pk, house_id, number in Entrance.objects.order_by("house__number", "number").values_list(
+            "pk", "house_id", "number"
+        ):
+            entrances[pk] = {"id": pk, "number": number, "apartments": []}
+            houses[house_id]["entrances"].append(entrances[pk])
+        for pk, entrance_id, number, is_blocked in Apartment.objects.order_by("entrance_id", "id").values_list(
+            "pk", "entrance_id", "number", "is_blocked"
+        ):
+            entrances[entrance_id]["apartments"].append(
+                {"id": pk, "number": number, "is_blocked": is_blocked}
+            )
+        return list(houses.values())
+
+
+def _fingerprint():
+    # у домов и подъездов нет updated_at — смену номера ловит сумма номеров
+    return (
+        House.objects.aggregate(Count("pk"), Max("pk"), Sum("number")),
+        Entrance.objects.aggregate(Count("pk"), Max("pk"), Sum("number")),
+        Apartment.objects.aggregate(Count("pk"), Max("pk"), Max("updated_at")),
+    )
+
+
+directory = DirectoryCache()
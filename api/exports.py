@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import SimpleUser, Apartment, Device
+
+CHUNK_SIZE = 2000
+
+# набор → (queryset, [(колонка, lookup ORM), ...]); пароли не выгружаются
+DATASETS = {
+    "residents": (
+        lambda: SimpleUser.objects.order_by("id"),
+        [
+            ("id", "id"),
+            ("login", "login"),
+            ("name", "name"),
+            ("role", "role"),
+            ("is_active", "is_active"),
+            ("has_parking", "has_parking"),
+            ("approval_status", "profile__approval_status"),
+            ("house_number", "profile__house_number"),
+            ("entrance_no", "profile__entrance_no"),
+            ("apartment_no", "profile__apartment_no"),
+            ("phone", "profile__phone"),
+            ("car_number", "profile__car_number"),
+            ("created_at", "created_at"),
+        ],
+    ),
+    "apartments": (
+        lambda: Apartment.objects.order_by("id"),
+        [
+            ("id", "id"),
+            ("house", "entrance__house__number"),
+            ("entrance", "entrance__number"),
+            ("number", "number"),
+            ("owner_name", "owner_name"),
+            ("is_blocked", "is_blocked"),
+            ("note", "note"),
+            ("created_at", "created_at"),
+        ],
+    ),
+    "devices": (
+        lambda: Device.objects.order_by("id"),
+        [
+            ("id", "id"),
+            ("house", "house__number"),
+            ("kind", "kind"),
+            ("entrance_no", "entrance_no"),
+            ("state", "state"),
+            ("updated_at", "updated_at"),
+        ],
+    ),
+}
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """csv.writer пишет сюда, а мы сразу отдаём строку наружу."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(dataset):
+    queryset, columns = DATASETS[dataset]
+    lookups = [lookup for _, lookup in columns]
+    return [name for name, _ in columns], queryset().values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def export_lines(dataset, fmt):
+    """Генератор строк выгрузки; в памяти одновременно не больше CHUNK_SIZE строк из БД."""
+    names, rows = _rows(dataset)
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield "﻿" + writer.writerow(names)  # BOM — чтобы Excel понял UTF-8
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
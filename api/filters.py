@@ -0,0 +1,97 @@
+from django.db.models import IntegerField
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def apartment_number_int():
+    # то же выражение, что в функциональном индексе Apartment — иначе индекс не сработает
+    return Cast("number", output_field=IntegerField())
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Ожидается целое число"})
+
+
+def _bool_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValidationError({name: "Ожидается true или false"})
+
+
+class ApartmentFilter(BaseFilterBackend):
+    """
+    Фильтры квартир:
+        ?house=1&entrance=3          — номер дома / подъезда
+        ?is_blocked=true
+        ?number_prefix=12            — номера, начинающиеся с «12»
+        ?number_min=100&number_max=150
+        ?ordering=-house,entrance,number
+    Префикс переводится в диапазон строк, диапазон — в выражение
+    функционального индекса, так что оба идут по индексам Apartment.
+    """
+
+    ordering_fields = {
+        "id": "id",
+        "house": "entrance__house__number",
+        "entrance": "entrance__number",
+        "number": "number_int",
+        "is_blocked": "is_blocked",
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {}
+
+        house = _int_param(params, "house")
+        if house is not None:
+            filters["entrance__house__number"] = house
+        entrance = _int_param(params, "entrance")
+        if entrance is not None:
+            filters["entrance__number"] = entrance
+        is_blocked = _bool_param(params, "is_blocked")
+        if is_blocked is not None:
+            filters["is_blocked"] = is_blocked
+
+        prefix = params.get("number_prefix")
+        if prefix:
+            # number LIKE 'p%' без индекса; [p, p') — тот же набор по B-tree
+            filters["number__gte"] = prefix
+            filters["number__lt"] = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+        number_min = _int_param(params, "number_min")
+        number_max = _int_param(params, "number_max")
+        ordering = self.get_ordering(params)
+        orders_by_number = any(field.lstrip("-") == "number_int" for field in ordering)
+        if number_min is not None or number_max is not None or orders_by_number:
+            queryset = queryset.alias(number_int=apartment_number_int())
+        if number_min is not None:
+            filters["number_int__gte"] = number_min
+        if number_max is not None:
+            filters["number_int__lte"] = number_max
+
+        queryset = queryset.filter(**filters)
+        if ordering:
+            queryset = queryset.order_by(*ordering, "id")
+        return queryset
+
+    def get_ordering(self, params):
+        ordering = []
+        for term in filter(None, params.get("ordering", "").split(",")):
+            desc = term.startswith("-")
+            field = self.ordering_fields.get(term.lstrip("-"))
+            if field is None:
+                raise ValidationError({"ordering": f"Недопустимое поле: {term}"})
+            ordering.append(f"-{field}" if desc else field)
+        return ordering
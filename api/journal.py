@@ -0,0 +1,145 @@
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .authentication import token_user_id
+from .models import Device, DeviceEvent
+
+logger = logging.getLogger(__name__)
+
+# кто меняет устройства в текущем запросе; контекст копируется в писателя БД и sync_to_async
+current_actor = ContextVar("device_actor", default="")
+
+
+@contextmanager
+def acting_as(actor):
+    token = current_actor.set(actor)
+    try:
+        yield
+    finally:
+        current_actor.reset(token)
+
+
+def actor_of(request, user=None):
+    """
+    Кто для журнала: "user:<id>@<IP>" — по Bearer-токену, "admin:<логин>@<IP>" —
+    сотрудник в админке (user), просто IP — без входа. IP — как у ограничителей
+    входа (REST_FRAMEWORK["NUM_PROXIES"]).
+    """
+    ip = BaseThrottle().get_ident(request)
+    if user is not None and user.is_authenticated:
+        return f"admin:{user.get_username()}@{ip}"
+    user_id = token_user_id(request)
+    return f"user:{user_id}@{ip}" if user_id is not None else ip
+
+
+class EventJournal:
+    """
+    Буфер событий устройств.
+
+    record() только кладёт кортеж в список — путь команды не ждёт БД.
+    Фоновый поток сбрасывает буфер одним bulk_create раз в
+    DEVICE_JOURNAL_FLUSH_INTERVAL секунд или при наполнении до
+    DEVICE_JOURNAL_BATCH_SIZE записей. Пачка, которую не удалось
+    записать, возвращается в начало буфера (не больше
+    DEVICE_JOURNAL_MAX_PENDING событий — дальше теряются самые старые).
+    Интервал 0 — без фонового потока (тесты): буфер пишут flush() и
+    record() при полной пачке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []  # (device_id, state, source, actor, created_at)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._started = False
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, device_id, state, source):
+        with self._lock:
+            self._buffer.append((device_id, state, source, current_actor.get(), timezone.now()))
+            full = len(self._buffer) >= settings.DEVICE_JOURNAL_BATCH_SIZE
+            if not self._started:
+                self._start()
+        if full:
+            if self._thread is None:
+                self.flush()
+            else:
+                self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            try:
+                self._write(batch)
+            except IntegrityError:
+                # устройство удалили, пока его события ждали записи, — их больше некуда писать
+                batch = self._alive(batch)
+                self._write(batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        self.written += len(batch)
+        return len(batch)
+
+    @staticmethod
+    def _write(batch):
+        # одна транзакция: при ошибке не записано ничего, пачку можно повторить целиком
+        DeviceEvent.objects.bulk_create(
+            [
+                DeviceEvent(device_id=device_id, state=state, source=source, actor=actor, created_at=created_at)
+                for device_id, state, source, actor, created_at in batch
+            ],
+            batch_size=500,
+        )
+
+    def _alive(self, batch):
+        alive = set(Device.objects.filter(pk__in={item[0] for item in batch}).values_list("pk", flat=True))
+        kept = [item for item in batch if item[0] in alive]
+        self.dropped += len(batch) - len(kept)
+        return kept
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._buffer[:0] = batch
+            overflow = len(self._buffer) - settings.DEVICE_JOURNAL_MAX_PENDING
+            if overflow > 0:
+                # БД недоступна долго: память процесса важнее самых старых событий
+                del self._buffer[:overflow]
+                self.dropped += overflow
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def _start(self):
+        # под замком, при первой записи
+        self._started = True
+        atexit.register(self.flush)
+        if settings.DEVICE_JOURNAL_FLUSH_INTERVAL:
+            self._thread = threading.Thread(target=self._run, name="device-journal", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.DEVICE_JOURNAL_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось записать журнал устройств")
+
+
+journal = EventJournal()
@@ -0,0 +1,48 @@
+# api/management/commands/_bench.py
+# Общее для команд bench_*: отдельная временная БД, чтобы замеры не трогали рабочую.
+
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from api.journal import journal
+
+
+@contextmanager
+def bench_database(verbosity=0, name=None):
+    """
+    Тестовая БД со всеми миграциями; удаляется после замера. Для SQLite — в памяти,
+    либо в файле name: общая in-memory база не ждёт блокировок между потоками.
+    """
+    old_name = connection.settings_dict["NAME"]
+    old_test = connection.settings_dict["TEST"]
+    if name:
+        connection.settings_dict["TEST"] = {**old_test, "NAME": name}
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        # события устройств — в удаляемую базу, а не atexit-сбросом в рабочую
+        journal.flush()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        connection.settings_dict["TEST"] = old_test
+
+
+def best_of(repeat, fn):
+    """Минимальное время из repeat прогонов fn() и результат последнего."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """{p: значение} по методу ближайшего ранга; пустая выборка — нули."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {p: 0.0 for p in points}
+    return {p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
@@ -0,0 +1,91 @@
+# api/management/commands/bench_async.py
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+import types
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+from api.models import House, Entrance, ENTRANCE_KINDS
+from api.registry import registry
+from api.urls import build_urlpatterns
+
+from ._bench import bench_database, percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает sync (DRF APIView) и async-версии команд устройств под ASGI: "
+        "конкурентные GET/POST через ASGI-обработчик Django (на временной SQLite-базе в файле)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=3000, help="Запросов на каждый вариант")
+        parser.add_argument("--concurrency", type=int, default=100, help="Одновременных запросов")
+        parser.add_argument("--post-share", type=float, default=0.1, help="Доля POST (команды жильцов)")
+        parser.add_argument("--entrances", type=int, default=8, help="Подъездов в доме")
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as tmp, bench_database(name=os.path.join(tmp, "bench.sqlite3")):
+            self.seed(opts["entrances"])
+            results = {}
+            for label, async_views in (("sync", False), ("async", True)):
+                urlconf = types.ModuleType(f"bench_async_{label}_urls")
+                urlconf.urlpatterns = build_urlpatterns(async_views=async_views)
+                with override_settings(ROOT_URLCONF=urlconf):
+                    results[label] = asyncio.run(self.run(opts))
+                self.report(label, results[label])
+
+        speedup = results["async"]["rps"] / results["sync"]["rps"] if results["sync"]["rps"] else 0
+        self.stdout.write(self.style.SUCCESS(f"async / sync по пропускной способности: x{speedup:.1f}"))
+
+    def seed(self, entrances):
+        house = House.objects.create(number=1)
+        Entrance.objects.bulk_create([Entrance(house=house, number=no) for no in range(1, entrances + 1)])
+        # все устройства заранее в registry: замеряем путь запроса, а не первое создание
+        for no in range(1, entrances + 1):
+            for kind in ENTRANCE_KINDS:
+                registry.get(kind, no, 1)
+
+    async def run(self, opts):
+        total, entrances = opts["requests"], opts["entrances"]
+        latencies, errors = [], 0
+        issued = 0
+
+        async def worker():
+            nonlocal issued, errors
+            client = AsyncClient(raise_request_exception=False)
+            rnd = random.Random()
+            while issued < total:
+                issued += 1
+                url = f"/api/houses/1/entrances/{rnd.randint(1, entrances)}/{rnd.choice(ENTRANCE_KINDS)}/"
+                started = time.perf_counter()
+                if rnd.random() < opts["post_share"]:
+                    response = await client.post(url, {"state": rnd.random() < 0.5}, content_type="application/json")
+                else:
+                    response = await client.get(url)
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(opts["concurrency"])))
+        elapsed = time.perf_counter() - started
+        return {
+            "rps": len(latencies) / elapsed,
+            "errors": errors,
+            "latency": percentiles(latencies),
+            "requests": len(latencies),
+        }
+
+    def report(self, label, result):
+        p = result["latency"]
+        line = (
+            f"  {label:<5} {result['rps']:8.0f} запр/с  "
+            f"p50 {p[50] * 1000:7.2f}  p95 {p[95] * 1000:7.2f}  p99 {p[99] * 1000:7.2f} мс  "
+            f"ошибок: {result['errors']} из {result['requests']}"
+        )
+        self.stdout.write(self.style.ERROR(line) if result["errors"] else line)
@@ -0,0 +1,174 @@
+# api/management/commands/bench_devices.py
+
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+from api.models import ENTRANCE_KINDS
+from api.registry import registry
+
+from ._bench import bench_database, percentiles
+from .seed_residents import ENTRANCE_RANGES
+
+
+# Маленькие ответы на keep-alive: без TCP_NODELAY алгоритм Нейгла ждёт delayed ACK
+# собеседника (~40 мс), и замер показывает его, а не время ответа API.
+
+class NoDelayWSGIServer(ThreadedWSGIServer):
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
+
+class NoDelayHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # без строки в stderr на каждый запрос
+    def log_message(self, format, *args):
+        pass
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузка на API устройств: локальный многопоточный WSGI-сервер на временной базе "
+        "после seed_residents, N контроллеров опрашивают api/entrances/<no>/<kind>/, "
+        "M жильцов шлют команды. Отчёт — JSON (пропускная способность, p50/p95/p99, ошибки)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--controllers", type=int, default=16, help="Контроллеров (GET по кругу)")
+        parser.add_argument("--residents", type=int, default=4, help="Жильцов (POST команд)")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Длительность прогона")
+        parser.add_argument("--poll-interval", type=float, default=0.0, help="Пауза контроллера между опросами, с")
+        parser.add_argument("--tap-interval", type=float, default=0.0, help="Пауза жильца между командами, с")
+        parser.add_argument("--output", help="Записать отчёт ещё и в этот файл")
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as tmp, bench_database(name=os.path.join(tmp, "bench.sqlite3")):
+            self.seed()
+            server = NoDelayWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+            server.set_app(get_wsgi_application())
+            thread = threading.Thread(target=server.serve_forever, name="bench-server", daemon=True)
+            thread.start()
+            try:
+                controllers, residents = self.run(server.server_address[1], opts)
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+
+        report = {
+            "commit": self.commit(),
+            "config": {
+                name: opts[name]
+                for name in ("controllers", "residents", "seconds", "poll_interval", "tap_interval")
+            },
+            "controllers": self.summary(controllers, opts["seconds"]),
+            "residents": self.summary(residents, opts["seconds"]),
+            "total": self.summary(controllers + residents, opts["seconds"]),
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                fh.write(output + "\n")
+        self.stdout.write(output)
+
+    def seed(self):
+        call_command("seed_residents", stdout=StringIO())
+        # устройства — заранее, как у работающей системы: замеряем опрос, а не первое создание
+        for no in ENTRANCE_RANGES:
+            for kind in ENTRANCE_KINDS:
+                registry.get(kind, no, settings.DEVICE_DEFAULT_HOUSE)
+
+    def run(self, port, opts):
+        deadline = time.monotonic() + opts["seconds"]
+        controllers = [Stats() for _ in range(opts["controllers"])]
+        residents = [Stats() for _ in range(opts["residents"])]
+
+        def url(rnd):
+            return f"/api/entrances/{rnd.choice(list(ENTRANCE_RANGES))}/{rnd.choice(ENTRANCE_KINDS)}/"
+
+        def poll(conn, rnd):
+            conn.request("GET", url(rnd))
+            return conn.getresponse()
+
+        def tap(conn, rnd):
+            body = json.dumps({"state": rnd.random() < 0.5})
+            conn.request("POST", url(rnd), body, {"Content-Type": "application/json"})
+            return conn.getresponse()
+
+        def loop(stats, op, pause):
+            rnd = random.Random()
+            conn = NoDelayHTTPConnection("127.0.0.1", port, timeout=30)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = op(conn, rnd)
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    # сервер закрыл соединение или не ответил — открываем заново
+                    conn.close()
+                    conn = NoDelayHTTPConnection("127.0.0.1", port, timeout=30)
+                    ok = False
+                stats.latencies.append(time.perf_counter() - started)
+                stats.errors += not ok
+                if pause:
+                    time.sleep(pause)
+            conn.close()
+
+        threads = [threading.Thread(target=loop, args=(s, poll, opts["poll_interval"])) for s in controllers]
+        threads += [threading.Thread(target=loop, args=(s, tap, opts["tap_interval"])) for s in residents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return controllers, residents
+
+    @staticmethod
+    def summary(stats, seconds):
+        latencies = [value for item in stats for value in item.latencies]
+        errors = sum(item.errors for item in stats)
+        p = percentiles(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "rps": round(len(latencies) / seconds, 1),
+            "latency_ms": {f"p{point}": round(value * 1000, 2) for point, value in p.items()},
+        }
+
+    @staticmethod
+    def commit():
+        # чтобы сравнивать прогоны между коммитами
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
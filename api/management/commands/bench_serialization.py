@@ -0,0 +1,56 @@
+# api/management/commands/bench_serialization.py
+
+from django.core.management.base import BaseCommand
+
+from api.models import House, Entrance, Apartment
+from api.serializers import ApartmentListSerializer
+from api.views import ApartmentViewSet
+
+from ._bench import bench_database, best_of
+
+
+class Command(BaseCommand):
+    help = "Сравнивает ApartmentListSerializer и values_list-путь списка квартир (на временной БД)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000, help="Сколько квартир создать")
+        parser.add_argument("--entrances", type=int, default=10, help="На сколько подъездов их разложить")
+        parser.add_argument("--repeat", type=int, default=5, help="Прогонов на каждый вариант")
+
+    def handle(self, *args, **opts):
+        with bench_database():
+            self.seed(opts["rows"], opts["entrances"])
+            self.run(opts["rows"], opts["repeat"])
+
+    def seed(self, rows, entrance_count):
+        house = House.objects.create(number=1)
+        entrances = Entrance.objects.bulk_create(
+            [Entrance(house=house, number=no) for no in range(1, entrance_count + 1)]
+        )
+        Apartment.objects.bulk_create(
+            [Apartment(entrance=entrances[i % entrance_count], number=str(i + 1)) for i in range(rows)],
+            batch_size=1000,
+        )
+
+    def run(self, rows, repeat):
+        queryset = ApartmentViewSet.queryset.all()
+        names = [name for name, _ in ApartmentViewSet.list_fields]
+        lookups = [lookup for _, lookup in ApartmentViewSet.list_fields]
+
+        def serializer_path():
+            return ApartmentListSerializer(queryset.all(), many=True).data
+
+        def values_path():
+            return [dict(zip(names, row)) for row in queryset.all().values_list(*lookups)]
+
+        slow, expected = best_of(repeat, serializer_path)
+        fast, actual = best_of(repeat, values_path)
+
+        if [dict(item) for item in expected] != actual:
+            self.stderr.write(self.style.ERROR("Ответы не совпадают!"))
+            return
+
+        self.stdout.write(f"Квартир: {rows}, лучший из {repeat} прогонов")
+        self.stdout.write(f"  сериализатор: {slow * 1000:8.1f} мс  ({slow / rows * 1e6:6.2f} мкс/строка)")
+        self.stdout.write(f"  values_list:  {fast * 1000:8.1f} мс  ({fast / rows * 1e6:6.2f} мкс/строка)")
+        self.stdout.write(self.style.SUCCESS(f"Ускорение: x{slow / fast:.1f}, ответы совпадают"))
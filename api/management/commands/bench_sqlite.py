@@ -0,0 +1,140 @@
+# api/management/commands/bench_sqlite.py
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+
+from api.authentication import issue_token
+from api.models import House, Entrance, SimpleUser
+from api.registry import registry
+
+from ._bench import bench_database, percentiles
+
+# Режим — переменные окружения настроек (aristokrat_backend/settings.py), каждый в своём процессе:
+# соединения фоновых потоков (журнал, писатель) живут весь процесс и не должны достаться
+# следующему режиму.
+# default — как сейчас: без прагм, BEGIN DEFERRED, соединение на запрос (CONN_MAX_AGE=0);
+# tuned — DJANGO_SQLITE_PRODUCTION: SQLITE_PRAGMAS, BEGIN IMMEDIATE, постоянные соединения;
+# writer — tuned + вся запись через один поток (api/writer.py)
+MODES = {
+    "default": {"DJANGO_SQLITE_PRODUCTION": "0", "DJANGO_DB_SERIAL_WRITER": "0"},
+    "tuned": {"DJANGO_SQLITE_PRODUCTION": "1", "DJANGO_DB_SERIAL_WRITER": "0"},
+    "writer": {"DJANGO_SQLITE_PRODUCTION": "1", "DJANGO_DB_SERIAL_WRITER": "1"},
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает SQLite по умолчанию, режим DJANGO_SQLITE_PRODUCTION и его же с единственным "
+        "писателем под конкурентной нагрузкой: потоки шлют команды устройств и читают журнал "
+        "через Django (registry, писатель, журнал) на временной базе в файле"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8, help="Потоков-писателей (команды устройств)")
+        parser.add_argument("--readers", type=int, default=8, help="Потоков-читателей (журнал событий)")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Длительность прогона каждого режима")
+        parser.add_argument("--devices", type=int, default=64, help="Сколько устройств (подъездов дома 1)")
+        parser.add_argument("--mode", choices=MODES, help="Только этот режим, в текущем процессе")
+
+    def handle(self, *args, **opts):
+        if opts["mode"]:
+            self.bench(opts)
+            return
+        self.stdout.write(
+            f"Писателей: {opts['writers']}, читателей: {opts['readers']}, "
+            f"{opts['seconds']:g} с на режим, устройств: {opts['devices']}"
+        )
+        for mode, env in MODES.items():
+            result = subprocess.run(
+                [
+                    sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_sqlite", "--mode", mode,
+                    *(f"--{name}={opts[name]}" for name in ("writers", "readers", "seconds", "devices")),
+                ],
+                env={**os.environ, **env}, capture_output=True, text=True,
+            )
+            self.stdout.write(result.stdout, ending="")
+            if result.returncode:
+                self.stderr.write(result.stderr)
+
+    def bench(self, opts):
+        with tempfile.TemporaryDirectory() as tmp, bench_database(name=os.path.join(tmp, "bench.sqlite3")):
+            token = self.seed(opts["devices"])
+            writes, reads = self.run(opts, token)
+        self.report(opts["mode"], "запись", writes, opts["seconds"])
+        self.report(opts["mode"], "чтение", reads, opts["seconds"])
+
+    def seed(self, devices):
+        house = House.objects.create(number=1)
+        Entrance.objects.bulk_create([Entrance(house=house, number=no) for no in range(1, devices + 1)])
+        registry.invalidate()
+        for no in range(1, devices + 1):
+            registry.get("door", no, 1)
+        # журнал по API — только администрации
+        staff = SimpleUser.objects.create(login="bench-admin", password="x", name="Бенчмарк", role="admin")
+        close_old_connections()
+        return issue_token(staff)[0]
+
+    def run(self, opts, token):
+        deadline = time.monotonic() + opts["seconds"]
+        devices = opts["devices"]
+        writes = [Stats() for _ in range(opts["writers"])]
+        reads = [Stats() for _ in range(opts["readers"])]
+
+        def loop(stats, op):
+            client = Client(raise_request_exception=False)
+            rnd = random.Random()
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = op(client, rnd)
+                # тестовый клиент не закрывает соединение по request_finished — как WSGI-сервер
+                close_old_connections()
+                stats.latencies.append(time.perf_counter() - started)
+                stats.errors += response.status_code != 200
+
+        def write(client, rnd):
+            # команда устройства: registry → писатель (UPDATE) → журнал событий пачкой
+            return client.post(
+                f"/api/houses/1/entrances/{rnd.randint(1, devices)}/door/",
+                {"state": rnd.random() < 0.5}, content_type="application/json",
+            )
+
+        def read(client, rnd):
+            return client.get(
+                f"/api/devices/events/?house=1&entrance_no={rnd.randint(1, devices)}",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+
+        threads = [threading.Thread(target=loop, args=(stats, write)) for stats in writes]
+        threads += [threading.Thread(target=loop, args=(stats, read)) for stats in reads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return writes, reads
+
+    def report(self, mode, label, stats, seconds):
+        latencies = [value for item in stats for value in item.latencies]
+        errors = sum(item.errors for item in stats)
+        p = percentiles(latencies)
+        line = (
+            f"  {mode:<8} {label}: {len(latencies) / seconds:8.0f} оп/с  "
+            f"p50 {p[50] * 1000:7.2f}  p95 {p[95] * 1000:7.2f}  p99 {p[99] * 1000:7.2f} мс  "
+            f"ошибок: {errors}"
+        )
+        self.stdout.write(self.style.ERROR(line) if errors else line)
@@ -0,0 +1,32 @@
+# api/management/commands/export_data.py
+
+from django.core.management.base import BaseCommand
+
+from api.exports import DATASETS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка residents / apartments / devices в CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="Файл (по умолчанию stdout)")
+
+    def handle(self, *args, **opts):
+        out = open(opts["output"], "w", encoding="utf-8", newline="") if opts["output"] else None
+        count = 0
+        try:
+            for line in export_lines(opts["dataset"], opts["fmt"]):
+                if out is None:
+                    self.stdout.write(line, ending="")
+                else:
+                    out.write(line)
+                count += 1
+        finally:
+            if out is not None:
+                out.close()
+
+        if opts["output"]:
+            rows = count - 1 if opts["fmt"] == "csv" else count
+            self.stderr.write(self.style.SUCCESS(f"Выгружено строк: {rows} → {opts['output']}"))
@@ -0,0 +1,243 @@
+# api/management/commands/import_residents.py
+
+import csv
+import time
+
+import phonenumbers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import (
+    House,
+    Entrance,
+    Apartment,
+    SimpleUser,
+    ResidentProfile,
+)
+
+# колонка CSV → поле; принимаются и имена из export_data
+COLUMN_ALIASES = {
+    "house_number": "house",
+    "entrance_no": "entrance",
+    "apartment_no": "apartment",
+}
+REQUIRED = ("login", "password")
+TRUE_VALUES = {"1", "true", "yes", "да", "+"}
+APPROVAL_VALUES = {code for code, _ in ResidentProfile.APPROVAL_CHOICES}
+ROLE_VALUES = {code for code, _ in SimpleUser.ROLE_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Импорт резидентов из CSV: upsert SimpleUser / ResidentProfile / Apartment пачками. "
+        "Колонки: login, password, name, phone, car_number, house, entrance, apartment, "
+        "has_parking, approval_status, role"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV-файл (UTF-8, первая строка — заголовок)")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--phone-region", default="RU", help="Регион для номеров без +код")
+        parser.add_argument("--dry-run", action="store_true", help="Только проверить строки")
+
+    def handle(self, *args, **opts):
+        self.phone_region = opts["phone_region"]
+        self.houses = {}
+        self.entrances = {}
+        started = time.perf_counter()
+        imported = errors = 0
+
+        with open(opts["path"], encoding="utf-8-sig", newline="") as fh:
+            reader = csv.DictReader(fh, delimiter=opts["delimiter"])
+            header = [COLUMN_ALIASES.get(name, name) for name in reader.fieldnames or ()]
+            missing = [name for name in REQUIRED if name not in header]
+            if missing:
+                raise CommandError(f"В файле нет колонок: {', '.join(missing)}")
+            reader.fieldnames = header
+
+            chunk = []
+            # строка 1 — заголовок
+            for line_no, raw in enumerate(reader, start=2):
+                try:
+                    chunk.append((line_no, self.clean(raw)))
+                except RowError as exc:
+                    errors += 1
+                    self.stderr.write(self.style.ERROR(f"строка {line_no}: {exc}"))
+                if len(chunk) >= opts["chunk_size"]:
+                    imported += self.flush(chunk, opts["dry_run"])
+                    chunk = []
+            imported += self.flush(chunk, opts["dry_run"])
+
+        elapsed = time.perf_counter() - started
+        verb = "Проверено строк" if opts["dry_run"] else "Импортировано строк"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {imported}, ошибок: {errors}, за {elapsed:.2f} с"))
+
+    # ---------- проверка строки ----------
+
+    def clean(self, raw):
+        row = {key: (value or "").strip() for key, value in raw.items() if key}
+
+        login, password = row["login"], row["password"]
+        if not login or not password:
+            raise RowError("login и password обязательны")
+        if len(login) > 64 or len(password) > 128:
+            raise RowError("login длиннее 64 или password длиннее 128 символов")
+
+        house = self._int(row, "house")
+        entrance = self._int(row, "entrance")
+        apartment = row.get("apartment", "")
+        if len(apartment) > 10:
+            raise RowError("apartment длиннее 10 символов")
+        if apartment and (house is None or entrance is None):
+            raise RowError("для квартиры нужны house и entrance")
+
+        approval = row.get("approval_status") or "accepted"
+        if approval not in APPROVAL_VALUES:
+            raise RowError(f"approval_status: ожидается одно из {sorted(APPROVAL_VALUES)}")
+        role = row.get("role") or "resident"
+        if role not in ROLE_VALUES:
+            raise RowError(f"role: ожидается одно из {sorted(ROLE_VALUES)}")
+
+        car_number = row.get("car_number", "").upper()
+        if len(car_number) > 32:
+            raise RowError("car_number длиннее 32 символов")
+
+        return {
+            "login": login,
+            "password": password,
+            "name": row.get("name", "")[:128],
+            "role": role,
+            "has_parking": row.get("has_parking", "").lower() in TRUE_VALUES,
+            "approval_status": approval,
+            "house": house,
+            "entrance": entrance,
+            "apartment": apartment,
+            "phone": self._phone(row.get("phone", "")),
+            "car_number": car_number,
+        }
+
+    @staticmethod
+    def _int(row, name):
+        value = row.get(name, "")
+        if not value:
+            return None
+        try:
+            number = int(value)
+        except ValueError:
+            raise RowError(f"{name}: ожидается целое число, получено {value!r}")
+        if number <= 0:
+            raise RowError(f"{name}: должно быть больше нуля")
+        return number
+
+    def _phone(self, value):
+        if not value:
+            return ""
+        try:
+            number = phonenumbers.parse(value, self.phone_region)
+        except phonenumbers.NumberParseException:
+            raise RowError(f"phone: не похоже на номер телефона ({value!r})")
+        if not phonenumbers.is_possible_number(number):
+            raise RowError(f"phone: неверная длина номера ({value!r})")
+        return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+    # ---------- запись пачки ----------
+
+    def flush(self, chunk, dry_run):
+        if not chunk:
+            return 0
+
+        # повтор логина внутри пачки: побеждает последняя строка
+        rows = {}
+        for line_no, row in chunk:
+            if row["login"] in rows:
+                self.stderr.write(self.style.WARNING(
+                    f"строка {line_no}: логин {row['login']} повторяется, берётся эта строка"
+                ))
+            rows[row["login"]] = row
+        if dry_run:
+            return len(rows)
+
+        with transaction.atomic():
+            self.ensure_structure(rows.values())
+            self.upsert_apartments(rows.values())
+
+            SimpleUser.objects.bulk_create(
+                [
+                    SimpleUser(
+                        login=row["login"],
+                        password=row["password"],  # ❗ НЕ хэшируем, как и везде
+                        name=row["name"],
+                        role=row["role"],
+                        has_parking=row["has_parking"],
+                    )
+                    for row in rows.values()
+                ],
+                update_conflicts=True,
+                unique_fields=["login"],
+                update_fields=["password", "name", "role", "has_parking", "updated_at"],
+            )
+            user_ids = dict(SimpleUser.objects.filter(login__in=rows).values_list("login", "id"))
+
+            ResidentProfile.objects.bulk_create(
+                [
+                    ResidentProfile(
+                        user_id=user_ids[login],
+                        approval_status=row["approval_status"],
+                        house_number=row["house"],
+                        entrance_no=row["entrance"],
+                        apartment_no=row["apartment"],
+                        phone=row["phone"],
+                        car_number=row["car_number"],
+                    )
+                    for login, row in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=[
+                    "approval_status", "house_number", "entrance_no",
+                    "apartment_no", "phone", "car_number", "updated_at",
+                ],
+            )
+        return len(rows)
+
+    def ensure_structure(self, rows):
+        """Дома и подъезды из пачки: недостающие — bulk_create, всё держим в словарях."""
+        house_nos = {row["house"] for row in rows if row["house"]} - set(self.houses)
+        if house_nos:
+            House.objects.bulk_create([House(number=no) for no in house_nos], ignore_conflicts=True)
+            self.houses.update(House.objects.filter(number__in=house_nos).values_list("number", "id"))
+
+        keys = {(row["house"], row["entrance"]) for row in rows if row["house"] and row["entrance"]}
+        keys -= set(self.entrances)
+        if keys:
+            Entrance.objects.bulk_create(
+                [Entrance(house_id=self.houses[h], number=e) for h, e in keys], ignore_conflicts=True
+            )
+            for pk, house_no, number in Entrance.objects.filter(
+                house__number__in={h for h, _ in keys}
+            ).values_list("id", "house__number", "number"):
+                self.entrances[(house_no, number)] = pk
+
+    def upsert_apartments(self, rows):
+        apartments = {}
+        for row in rows:
+            if row["apartment"]:
+                key = (self.entrances[(row["house"], row["entrance"])], row["apartment"])
+                apartments[key] = row["name"]
+
+        named = [Apartment(entrance_id=e, number=n, owner_name=name) for (e, n), name in apartments.items() if name]
+        unnamed = [Apartment(entrance_id=e, number=n) for (e, n), name in apartments.items() if not name]
+        if named:
+            Apartment.objects.bulk_create(
+                named,
+                update_conflicts=True,
+                unique_fields=["entrance", "number"],
+                update_fields=["owner_name", "updated_at"],
+            )
+        if unnamed:
+            Apartment.objects.bulk_create(unnamed, ignore_conflicts=True)
@@ -1,6 +1,9 @@
 # api/management/commands/seed_residents.py
 
-from django.core.management.base import BaseCommand
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from api.models import (
@@ -22,95 +25,145 @@ ENTRANCE_RANGES = {
     8: (309, 352),
 }
 
+# SQLite ограничивает число параметров в одном запросе
+LOOKUP_CHUNK = 5000
+
 
-def entrance_for(apt: int) -> int | None:
-    for en, (a, b) in ENTRANCE_RANGES.items():
-        if a <= apt <= b:
-            return en
-    return None
+def load_layout(path):
+    """
+    JSON-раскладка: {"<дом>": {"<подъезд>": [первая_кв, последняя_кв], ...}, ...}
+    Возвращает {дом: {подъезд: (a, b)}}.
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+        return {
+            int(house): {int(en): (int(a), int(b)) for en, (a, b) in entrances.items()}
+            for house, entrances in raw.items()
+        }
+    except (OSError, ValueError, TypeError, AttributeError) as exc:
+        raise CommandError(f"Не удалось прочитать раскладку {path}: {exc}")
 
 
 class Command(BaseCommand):
-    help = "Создаёт дом, подъезды, квартиры, SimpleUser и ResidentProfile"
+    help = "Создаёт дома, подъезды, квартиры, SimpleUser и ResidentProfile"
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--house",
             type=int,
             default=1,
-            help="Номер дома (по умолчанию 1)",
+            help="Номер (первого) дома (по умолчанию 1)",
+        )
+        parser.add_argument(
+            "--houses",
+            type=int,
+            default=1,
+            help="Сколько домов подряд создать с раскладкой ENTRANCE_RANGES (по умолчанию 1)",
+        )
+        parser.add_argument(
+            "--layout",
+            help="JSON-файл с раскладкой домов (заменяет --house/--houses)",
+        )
+        parser.add_argument(
+            "--login-format",
+            help="Шаблон логина: {house}, {apt}, {entrance}. "
+                 "По умолчанию '{apt}-{entrance}' для одного дома и '{house}-{apt}-{entrance}' для нескольких",
         )
 
     @transaction.atomic
     def handle(self, *args, **opts):
-        house_no = opts["house"]
+        started = time.perf_counter()
 
-        # ---------- Дом ----------
-        house, _ = House.objects.get_or_create(number=house_no)
-        self.stdout.write(self.style.SUCCESS(f"Дом №{house_no}: OK"))
+        if opts["layout"]:
+            layout = load_layout(opts["layout"])
+        else:
+            first = opts["house"]
+            layout = {no: ENTRANCE_RANGES for no in range(first, first + opts["houses"])}
+
+        login_format = opts["login_format"] or (
+            "{apt}-{entrance}" if len(layout) == 1 else "{house}-{apt}-{entrance}"
+        )
+
+        # ---------- Дома ----------
+        House.objects.bulk_create([House(number=no) for no in layout], ignore_conflicts=True)
+        houses = dict(House.objects.filter(number__in=layout).values_list("number", "id"))
+        self.stdout.write(self.style.SUCCESS(f"Домов: {len(houses)}"))
 
         # ---------- Подъезды ----------
-        entrances = {}
-        for no in range(1, 9):
-            ent, _ = Entrance.objects.get_or_create(house=house, number=no)
-            entrances[no] = ent
-        self.stdout.write(self.style.SUCCESS("Подъезды 1..8: OK"))
+        Entrance.objects.bulk_create(
+            [
+                Entrance(house_id=houses[house_no], number=en)
+                for house_no, entrances in layout.items()
+                for en in entrances
+            ],
+            ignore_conflicts=True,
+        )
+        entrance_ids = {
+            (house_no, number): pk
+            for pk, house_no, number in Entrance.objects.filter(
+                house_id__in=houses.values()
+            ).values_list("id", "house__number", "number")
+        }
+        self.stdout.write(self.style.SUCCESS(f"Подъездов: {len(entrance_ids)}"))
 
         # ---------- Квартиры ----------
-        apartments = []
-        for en, (a, b) in ENTRANCE_RANGES.items():
-            for apt in range(a, b + 1):
-                apartments.append(
-                    Apartment(
-                        entrance=entrances[en],
-                        number=str(apt),
-                    )
-                )
-
+        apartments = [
+            Apartment(entrance_id=entrance_ids[(house_no, en)], number=str(apt))
+            for house_no, entrances in layout.items()
+            for en, (a, b) in entrances.items()
+            for apt in range(a, b + 1)
+        ]
         Apartment.objects.bulk_create(
             apartments,
-            batch_size=500,
+            batch_size=2000,
             ignore_conflicts=True,
         )
-        self.stdout.write(self.style.SUCCESS("Квартиры: OK"))
+        self.stdout.write(self.style.SUCCESS(f"Квартир: {len(apartments)}"))
 
         # ---------- Пользователи + профили ----------
-        users = []
-        profiles = []
-
-        for en, (a, b) in ENTRANCE_RANGES.items():
-            for apt in range(a, b + 1):
-                en_calc = entrance_for(apt) or en
-                login = f"{apt}-{en_calc}"
+        # адрес берём из той же раскладки — без повторного чтения пользователей по regex
+        addresses = {}
+        for house_no, entrances in layout.items():
+            for en, (a, b) in entrances.items():
+                for apt in range(a, b + 1):
+                    login = login_format.format(house=house_no, apt=apt, entrance=en)
+                    addresses[login] = (house_no, en, apt)
+
+        logins = list(addresses)
+        existing = set()
+        for i in range(0, len(logins), LOOKUP_CHUNK):
+            existing.update(
+                SimpleUser.objects.filter(login__in=logins[i:i + LOOKUP_CHUNK]).values_list("login", flat=True)
+            )
 
-                user = SimpleUser(
-                    login=login,
-                    password=str(apt),          # ❗ НЕ хэшируем
-                    role="resident",
-                    is_active=True,
-                )
-                users.append(user)
+        users = [
+            SimpleUser(
+                login=login,
+                password=str(addresses[login][2]),          # ❗ НЕ хэшируем
+                role="resident",
+                is_active=True,
+            )
+            for login in logins
+            if login not in existing
+        ]
 
+        # без ignore_conflicts — так bulk_create возвращает pk новых строк
         SimpleUser.objects.bulk_create(
             users,
-            batch_size=300,
-            ignore_conflicts=True,
-        )
-
-        created_users = SimpleUser.objects.filter(
-            login__regex=r"^\d+-\d+$"
+            batch_size=2000,
         )
 
-        for user in created_users:
-            apt_str, en_str = user.login.split("-", 1)
-
+        profiles = []
+        for user in users:
+            house_no, en, apt = addresses[user.login]
             profiles.append(
                 ResidentProfile(
                     user=user,
                     approval_status="accepted",
                     house_number=house_no,
-                    entrance_no=int(en_str),
-                    apartment_no=apt_str,
+                    entrance_no=en,
+                    apartment_no=str(apt),
                     car_number="",
                     phone="",
                 )
@@ -118,19 +171,22 @@ class Command(BaseCommand):
 
         ResidentProfile.objects.bulk_create(
             profiles,
-            batch_size=500,
+            batch_size=2000,
             ignore_conflicts=True,
         )
 
         self.stdout.write(
-            self.style.SUCCESS(f"Создано пользователей: {len(users)}")
+            self.style.SUCCESS(f"Создано пользователей: {len(users)} (уже было: {len(existing)})")
         )
         self.stdout.write(
             self.style.SUCCESS(f"Создано профилей: {len(profiles)}")
         )
 
+        example_house = next(iter(layout))
+        example = login_format.format(house=example_house, apt=125, entrance=3)
         self.stdout.write(
             self.style.WARNING(
-                "Логин: '<квартира>-<подъезд>', Пароль: '<квартира>'  (пример: 125-3 / 125)"
+                f"Логин: '{login_format}', Пароль: '<квартира>'  (пример: {example} / 125)"
             )
         )
+        self.stdout.write(f"Готово за {time.perf_counter() - started:.2f} с")
@@ -0,0 +1,55 @@
+# api/management/commands/sync_replicas.py
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.routers import replica_lag
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует SQLite-базу default в реплики из DJANGO_DB_REPLICAS (online backup API — "
+        "безопасно при открытых соединениях). С --interval повторяет копирование по кругу"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="Какие реплики (по умолчанию все)")
+        parser.add_argument("--interval", type=float, help="Синхронизировать каждые N секунд, до Ctrl+C")
+        parser.add_argument("--pages", type=int, default=1024, help="Страниц за шаг backup (меньше — короче блокировки)")
+
+    def handle(self, *args, **opts):
+        aliases = opts["aliases"] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError("Реплики не настроены: задайте DJANGO_DB_REPLICAS")
+        source = connections.settings[DEFAULT_DB_ALIAS]
+        for alias in aliases:
+            if alias not in settings.DATABASE_REPLICAS:
+                raise CommandError(f"{alias}: не реплика (есть: {', '.join(settings.DATABASE_REPLICAS)})")
+            if connections.settings[alias]["ENGINE"] != source["ENGINE"] or "sqlite3" not in source["ENGINE"]:
+                raise CommandError(f"{alias}: копированием синхронизируются только SQLite-реплики")
+
+        while True:
+            for alias in aliases:
+                self.sync(str(source["NAME"]), alias, opts["pages"])
+            replica_lag.reset()
+            if not opts["interval"]:
+                break
+            time.sleep(opts["interval"])
+
+    def sync(self, source_name, alias, pages):
+        started = time.perf_counter()
+        target_name = str(connections.settings[alias]["NAME"])
+        src = sqlite3.connect(source_name)
+        dst = sqlite3.connect(target_name)
+        try:
+            src.backup(dst, pages=pages)
+        finally:
+            dst.close()
+            src.close()
+        self.stdout.write(
+            self.style.SUCCESS(f"{alias} ← {source_name}: {time.perf_counter() - started:.2f} с")
+        )
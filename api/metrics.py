@@ -0,0 +1,331 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .authentication import identity_cache
+from .journal import journal
+from .registry import registry
+from .throttling import login_ip_limiter, login_name_limiter
+from .writer import writer
+
+# Границы гистограмм. Время — от долей миллисекунды (попадание в registry,
+# логин по кэшу) до long-poll (DEVICE_POLL_TIMEOUT); размер ответа — байты.
+LATENCY_BUCKETS = (
+    0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000)
+
+UNMATCHED = "<unmatched>"  # 404 мимо urls — одна метка, а не по метке на URL
+
+# запросы к БД текущего HTTP-запроса: [число, секунды] (ставит MetricsMiddleware);
+# контекст копируется в sync_to_async, так что считаются и запросы async view
+_current = ContextVar("request_queries", default=None)
+
+
+# ---------- DB ----------
+
+def _count_query(execute, sql, params, many, context):
+    counter = _current.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter[0] += 1
+        counter[1] += time.perf_counter() - started
+
+
+def track_queries(connection):
+    """Подключить счётчик запросов к соединению (сигнал connection_created)."""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+# ---------- AGGREGATION ----------
+
+class RouteStats:
+    """Счётчики одного (method, route) в одном потоке."""
+
+    __slots__ = (
+        "count", "latency", "latency_sum", "size", "size_sum", "sized",
+        "queries", "query_time", "statuses",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.latency = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.size = [0] * len(SIZE_BUCKETS)
+        self.size_sum = 0
+        self.sized = 0
+        self.queries = 0
+        self.query_time = 0.0
+        self.statuses = {}
+
+    def observe(self, status, duration, size, queries, query_time):
+        self.count += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        # bisect_left: значение, равное границе, попадает в её корзину (le)
+        index = bisect_left(LATENCY_BUCKETS, duration)
+        if index < len(LATENCY_BUCKETS):
+            self.latency[index] += 1
+        self.latency_sum += duration
+        if size is not None:
+            index = bisect_left(SIZE_BUCKETS, size)
+            if index < len(SIZE_BUCKETS):
+                self.size[index] += 1
+            self.size_sum += size
+            self.sized += 1
+        self.queries += queries
+        self.query_time += query_time
+
+    def merge(self, other):
+        self.count += other.count
+        self.latency = [a + b for a, b in zip(self.latency, other.latency)]
+        self.latency_sum += other.latency_sum
+        self.size = [a + b for a, b in zip(self.size, other.size)]
+        self.size_sum += other.size_sum
+        self.sized += other.sized
+        self.queries += other.queries
+        self.query_time += other.query_time
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+class RequestMetrics:
+    """
+    Метрики запросов по маршрутам.
+
+    Каждый поток пишет только в свой шард (dict (method, route) -> RouteStats) —
+    на пути запроса нет замков. Замок берётся при появлении нового потока и при
+    сборе: collect() складывает шарды, а шарды завершившихся потоков переносит
+    в общий итог, чтобы их число не росло с потоками runserver / sync_to_async.
+    Шард живого потока читается без замка — снимок может отстать на запрос.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []  # (thread, shard)
+        self._retired = {}
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def observe(self, method, route, status, duration, size=None, queries=0, query_time=0.0):
+        shard = self._shard()
+        stats = shard.get((method, route))
+        if stats is None:
+            stats = shard[(method, route)] = RouteStats()
+        stats.observe(status, duration, size, queries, query_time)
+
+    def collect(self):
+        """{(method, route): RouteStats} — сумма по всем потокам."""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    _merge_into(self._retired, shard.items())
+            self._shards = alive
+            total = {}
+            _merge_into(total, self._retired.items())
+            for _, shard in alive:
+                # list() над dict — одна операция под GIL, даже если поток добавляет маршрут
+                _merge_into(total, list(shard.items()))
+            return total
+
+    def reset(self):
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+
+def _merge_into(total, items):
+    for key, stats in items:
+        if key not in total:
+            total[key] = RouteStats()
+        total[key].merge(stats)
+
+
+request_metrics = RequestMetrics()
+
+
+# ---------- MIDDLEWARE ----------
+
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    return "/" + match.route if match is not None and match.route else UNMATCHED
+
+
+def _size(response):
+    # у потоковых ответов (SSE) размер заранее неизвестен
+    return None if response.streaming else len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время запросов к БД, размер ответа — по шаблону
+    маршрута из urls.py (не по URL: номера домов и подъездов не плодят метки).
+    Для потоковых ответов время — до заголовков. Стоит первой в MIDDLEWARE,
+    чтобы учитывать и остальные middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = [0, 0.0]
+        token = _current.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = [0, 0.0]
+        token = _current.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.observe(request, response, time.perf_counter() - started, counter)
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, counter):
+        request_metrics.observe(
+            request.method, _route(request), response.status_code,
+            duration, _size(response), counter[0], counter[1],
+        )
+
+
+# ---------- PROMETHEUS ----------
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _header(lines, name, kind, help_text):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _histogram(lines, name, bounds, counts, total, count, **labels):
+    cumulative = 0
+    for bound, value in zip(bounds, counts):
+        cumulative += value
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {count}')
+    lines.append(f"{name}_sum{_labels(**labels)} {total}")
+    lines.append(f"{name}_count{_labels(**labels)} {count}")
+
+
+def _request_lines(lines):
+    routes = sorted(request_metrics.collect().items())
+
+    _header(lines, "aristokrat_http_requests_total", "counter", "Ответы по маршруту и коду")
+    for (method, route), stats in routes:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(
+                f"aristokrat_http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+            )
+
+    _header(lines, "aristokrat_http_request_duration_seconds", "histogram", "Время ответа, с")
+    for (method, route), stats in routes:
+        _histogram(
+            lines, "aristokrat_http_request_duration_seconds", LATENCY_BUCKETS,
+            stats.latency, stats.latency_sum, stats.count, method=method, route=route,
+        )
+
+    _header(lines, "aristokrat_http_response_size_bytes", "histogram", "Размер ответа (кроме потоковых), байт")
+    for (method, route), stats in routes:
+        _histogram(
+            lines, "aristokrat_http_response_size_bytes", SIZE_BUCKETS,
+            stats.size, stats.size_sum, stats.sized, method=method, route=route,
+        )
+
+    _header(lines, "aristokrat_http_db_queries_total", "counter", "Запросы к БД за время ответов")
+    for (method, route), stats in routes:
+        lines.append(f"aristokrat_http_db_queries_total{_labels(method=method, route=route)} {stats.queries}")
+
+    _header(lines, "aristokrat_http_db_query_seconds_total", "counter", "Время запросов к БД, с")
+    for (method, route), stats in routes:
+        lines.append(
+            f"aristokrat_http_db_query_seconds_total{_labels(method=method, route=route)} {stats.query_time}"
+        )
+
+
+def _component_lines(lines):
+    def metric(name, kind, help_text, samples):
+        _header(lines, name, kind, help_text)
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    devices = registry.stats()
+    metric("aristokrat_registry_hits_total", "counter", "Чтения устройств из памяти", [({}, devices["hits"])])
+    metric("aristokrat_registry_misses_total", "counter", "Чтения устройств мимо памяти", [({}, devices["misses"])])
+    metric("aristokrat_registry_devices", "gauge", "Устройств в registry", [({}, devices["size"])])
+    metric("aristokrat_registry_version", "gauge", "Версия состояний устройств", [({}, devices["version"])])
+    metric("aristokrat_registry_subscribers", "gauge", "Открытых SSE-подписок", [({}, devices["subscribers"])])
+
+    metric("aristokrat_identity_cache_hits_total", "counter", "Пользователь по токену из кэша",
+           [({}, identity_cache.hits)])
+    metric("aristokrat_identity_cache_misses_total", "counter", "Пользователь по токену из БД",
+           [({}, identity_cache.misses)])
+
+    limiters = [({"limiter": "ip"}, login_ip_limiter.stats()), ({"limiter": "login"}, login_name_limiter.stats())]
+    metric("aristokrat_login_throttle_allowed_total", "counter", "Пропущенные попытки входа",
+           [(labels, stats["allowed"]) for labels, stats in limiters])
+    metric("aristokrat_login_throttle_rejected_total", "counter", "Отклонённые попытки входа (429)",
+           [(labels, stats["rejected"]) for labels, stats in limiters])
+    metric("aristokrat_login_throttle_keys", "gauge", "Ключей в окне ограничителя",
+           [(labels, stats["keys"]) for labels, stats in limiters])
+
+    metric("aristokrat_journal_written_total", "counter", "Событий устройств записано в БД", [({}, journal.written)])
+    metric("aristokrat_journal_pending", "gauge", "Событий устройств ждут записи", [({}, journal.pending())])
+    metric("aristokrat_journal_dropped_total", "counter", "Событий устройств потеряно без записи",
+           [({}, journal.dropped)])
+
+    metric("aristokrat_writer_done_total", "counter", "Выполненные задачи писателя БД", [({}, writer.done)])
+    metric("aristokrat_writer_failed_total", "counter", "Задачи писателя БД с ошибкой", [({}, writer.failed)])
+    metric("aristokrat_writer_pending", "gauge", "Задачи в очереди писателя БД", [({}, writer.pending())])
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    _request_lines(lines)
+    _component_lines(lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_alter_apartment_options_alter_device_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.BooleanField(verbose_name='Включено')),
+                ('source', models.PositiveSmallIntegerField(choices=[(1, 'API'), (2, 'Пакетная команда'), (3, 'Админка')], verbose_name='Источник')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.device', verbose_name='Устройство')),
+            ],
+            options={
+                'verbose_name': 'Событие устройства',
+                'verbose_name_plural': 'События устройств',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['device', 'created_at'], name='device_event_device_time')],
+            },
+        ),
+    ]
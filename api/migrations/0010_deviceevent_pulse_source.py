@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_deviceevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deviceevent',
+            name='source',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'API'), (2, 'Пакетная команда'), (3, 'Админка'), (4, 'Авто-возврат импульса')], verbose_name='Источник'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:51
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_deviceevent_pulse_source'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['entrance', 'is_blocked'], name='apartment_entrance_blocked'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(models.F('entrance'), django.db.models.functions.comparison.Cast('number', output_field=models.IntegerField()), name='apartment_entrance_number_int'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:59
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def drop_duplicate_devices(apps, schema_editor):
+    # unique_together не ловил повторы с entrance_no = NULL — оставляем самое старое устройство,
+    # журнал повторов переносим на него (удаление устройства удалило бы события каскадом)
+    Device = apps.get_model("api", "Device")
+    DeviceEvent = apps.get_model("api", "DeviceEvent")
+    survivors = {}
+    duplicates = {}  # pk повтора -> pk оставшегося
+    for pk, kind, entrance_no in Device.objects.order_by("id").values_list("id", "kind", "entrance_no"):
+        survivor = survivors.setdefault((kind, entrance_no), pk)
+        if survivor != pk:
+            duplicates[pk] = survivor
+    for pk, survivor in duplicates.items():
+        DeviceEvent.objects.filter(device_id=pk).update(device_id=survivor)
+    Device.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_apartment_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='device',
+            options={'ordering': ['house_id', 'entrance_no', 'kind'], 'verbose_name': 'Устройство', 'verbose_name_plural': 'Устройства'},
+        ),
+        migrations.AlterUniqueTogether(
+            name='device',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='house',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='devices', to='api.house', verbose_name='Дом'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['house', 'entrance_no', 'kind'], name='device_house_entrance_kind'),
+        ),
+        migrations.RunPython(drop_duplicate_devices, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='device',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('house', models.Value(0)), django.db.models.functions.comparison.Coalesce('entrance_no', models.Value(0)), models.F('kind'), name='device_unique_place'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def attach_to_default_house(apps, schema_editor):
+    # устройства без дома — к дому DEVICE_DEFAULT_HOUSE, куда теперь ведут маршруты без номера дома;
+    # если там уже есть такое же устройство, сливаем: журнал — на одно, состояние — последнее изменённое
+    House = apps.get_model("api", "House")
+    Device = apps.get_model("api", "Device")
+    DeviceEvent = apps.get_model("api", "DeviceEvent")
+    if settings.DEVICE_DEFAULT_HOUSE is None:
+        return
+    house = House.objects.filter(number=settings.DEVICE_DEFAULT_HOUSE).first()
+    if house is None:
+        return
+    for legacy in Device.objects.filter(house__isnull=True):
+        target = Device.objects.filter(house=house, kind=legacy.kind, entrance_no=legacy.entrance_no).first()
+        # update(), а не save(): auto_now не должен трогать updated_at
+        if target is None:
+            Device.objects.filter(pk=legacy.pk).update(house=house)
+            continue
+        DeviceEvent.objects.filter(device=legacy).update(device=target)
+        if legacy.updated_at > target.updated_at:
+            Device.objects.filter(pk=target.pk).update(state=legacy.state, updated_at=legacy.updated_at)
+        legacy.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_device_house'),
+    ]
+
+    operations = [
+        migrations.RunPython(attach_to_default_house, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_device_default_house'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deviceevent',
+            name='actor',
+            field=models.CharField(blank=True, default='', max_length=200, verbose_name='Кто'),
+        ),
+    ]
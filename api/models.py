@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import F, Q, Value
+from django.db.models.functions import Cast, Coalesce
 
 # ---------- USERS ----------
 
@@ -109,6 +111,14 @@ class Apartment(models.Model):
         ordering = ["entrance", "id"]
         verbose_name = "Квартира"
         verbose_name_plural = "Квартиры"
+        indexes = [
+            # фильтры ApartmentFilter (api/filters.py)
+            models.Index(fields=["entrance", "is_blocked"], name="apartment_entrance_blocked"),
+            models.Index(
+                F("entrance"), Cast("number", output_field=models.IntegerField()),
+                name="apartment_entrance_number_int",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.entrance} - Кв. {self.number}"
@@ -117,6 +127,8 @@ class Apartment(models.Model):
 # ---------- DEVICES ----------
 
 MAX_ENTRANCES = 8
+ENTRANCE_KINDS = ("door", "lift_pass", "lift_gruz")
+GLOBAL_KINDS = ("kalitka1", "kalitka2", "kalitka3", "kalitka4", "parking")
 
 class Device(models.Model):
     KIND_CHOICES = [
@@ -130,28 +142,93 @@ class Device(models.Model):
         ("parking", "Паркинг"),
     ]
 
+    # пустой дом — устройства «по умолчанию» для старых маршрутов без номера дома;
+    # отдельный индекс по house не нужен — его покрывает составной (house, entrance_no, kind)
+    house = models.ForeignKey(
+        House,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="devices",
+        db_index=False,
+        verbose_name="Дом",
+    )
     kind = models.CharField(max_length=32, choices=KIND_CHOICES, verbose_name="Тип устройства")
     entrance_no = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Номер подъезда")
     state = models.BooleanField(default=False, verbose_name="Включено")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
     class Meta:
-        unique_together = ("kind", "entrance_no")
         verbose_name = "Устройство"
         verbose_name_plural = "Устройства"
-        ordering = ["entrance_no", "kind"]
+        ordering = ["house_id", "entrance_no", "kind"]
+        indexes = [
+            models.Index(fields=["house", "entrance_no", "kind"], name="device_house_entrance_kind"),
+        ]
         constraints = [
+            # NULL в UNIQUE не равен NULL: без Coalesce дублировались бы калитки и старые устройства
+            models.UniqueConstraint(
+                Coalesce("house", Value(0)),
+                Coalesce("entrance_no", Value(0)),
+                "kind",
+                name="device_unique_place",
+            ),
             models.CheckConstraint(
                 name="device_entrance_rules",
                 condition=(
-                    Q(kind__in=["door", "lift_pass", "lift_gruz"], entrance_no__isnull=False)
-                    | Q(kind__in=["kalitka1", "kalitka2", "kalitka3", "kalitka4", "parking"], entrance_no__isnull=True)
+                    Q(kind__in=list(ENTRANCE_KINDS), entrance_no__isnull=False)
+                    | Q(kind__in=list(GLOBAL_KINDS), entrance_no__isnull=True)
                 ),
             )
         ]
 
     def __str__(self):
         kind_display = self.get_kind_display()
+        place = []
+        if self.house_id:
+            place.append(f"дом {self.house.number}")
         if self.entrance_no:
-            return f"{kind_display} (подъезд {self.entrance_no})"
+            place.append(f"подъезд {self.entrance_no}")
+        if place:
+            return f"{kind_display} ({', '.join(place)})"
         return kind_display
+
+
+# ---------- DEVICE EVENTS ----------
+
+SOURCE_API = 1
+SOURCE_BATCH = 2
+SOURCE_ADMIN = 3
+SOURCE_PULSE = 4
+
+
+class DeviceEvent(models.Model):
+    """Журнал смен состояния устройств. Только добавление, пишется пачками (api/journal.py)."""
+
+    SOURCE_CHOICES = [
+        (SOURCE_API, "API"),
+        (SOURCE_BATCH, "Пакетная команда"),
+        (SOURCE_ADMIN, "Админка"),
+        (SOURCE_PULSE, "Авто-возврат импульса"),
+    ]
+
+    # отдельный индекс по device не нужен — его покрывает составной (device, created_at)
+    device = models.ForeignKey(
+        Device, on_delete=models.CASCADE, related_name="events", db_index=False, verbose_name="Устройство"
+    )
+    state = models.BooleanField(verbose_name="Включено")
+    source = models.PositiveSmallIntegerField(choices=SOURCE_CHOICES, verbose_name="Источник")
+    # "user:<id>@<IP>", "admin:<логин>@<IP>" или IP; пусто — авто-возврат, скрипты
+    actor = models.CharField(max_length=200, blank=True, default="", verbose_name="Кто")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Время")
+
+    class Meta:
+        verbose_name = "Событие устройства"
+        verbose_name_plural = "События устройств"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["device", "created_at"], name="device_event_device_time"),
+        ]
+
+    def __str__(self):
+        return f"{self.device} → {'вкл' if self.state else 'выкл'} ({self.created_at:%d.%m.%Y %H:%M:%S})"
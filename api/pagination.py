@@ -0,0 +1,96 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по (key_field, id): страница — это WHERE по ключу
+    последней строки + LIMIT, без OFFSET и без COUNT(*).
+
+    ?cursor=          — первая страница
+    ?cursor=<токен>   — следующая (токен из поля "next")
+    ?count=1          — добавить "count" (отдельный COUNT(*), по запросу)
+
+    Порядок задаёт ключ, поэтому ?ordering= вместе с курсором — 400:
+    иначе сортировка молча терялась бы.
+    """
+
+    page_size = 50
+    key_field = None
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering_query_param = "ordering"
+    invalid_cursor_message = "Неверный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get(self.ordering_query_param):
+            raise ValidationError(
+                {self.ordering_query_param: f"Не сочетается с {self.cursor_query_param}: порядок задаёт курсор"}
+            )
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.count = queryset.count()
+
+        key = self.decode_cursor(request)
+        queryset = queryset.order_by(self.key_field, "id")
+        if key is not None:
+            # key >= k AND (key > k OR id > i): диапазон по индексу на key_field
+            queryset = queryset.filter(
+                Q(**{f"{self.key_field}__gt": key[0]})
+                | Q(**{self.key_field: key[0], "id__gt": key[1]}),
+                **{f"{self.key_field}__gte": key[0]},
+            )
+
+        rows = list(queryset[: self.page_size + 1])
+        self.next_key = None
+        if len(rows) > self.page_size:
+            rows = rows[: self.page_size]
+            self.next_key = self.get_row_key(rows[-1])
+        return rows
+
+    def get_row_key(self, row):
+        return getattr(row, self.key_field), row.id
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode()).decode()
+            key, pk = raw.split(":")
+            return int(key), int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, key):
+        return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode()
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        payload = {"next": self.get_next_link(), "results": data}
+        if self.count is not None:
+            payload = {"count": self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,12 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsAdministrator(BasePermission):
+    """Сотрудник Django-админки (сессия) или SimpleUser с ролью admin (Bearer-токен)."""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user and user.is_authenticated
+            and (getattr(user, "is_staff", False) or getattr(user, "role", None) == "admin")
+        )
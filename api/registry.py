@@ -0,0 +1,440 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Value, When
+from django.http import Http404
+from django.utils import timezone
+
+from .changes import ChangeProbe
+from .journal import journal
+from .models import Device, House, ENTRANCE_KINDS, GLOBAL_KINDS, SOURCE_API, SOURCE_BATCH, SOURCE_PULSE
+from .routers import primary
+from .scheduler import scheduler
+from .writer import writer
+
+
+class DeviceRegistry:
+    """
+    Состояние устройств в памяти процесса.
+
+    GET-запросы контроллеров читаются отсюда без обращения к БД.
+    Запись идёт в БД и в память под одним замком; правки из админки
+    приходят через сигналы (save/delete) и через invalidate() (qs.update),
+    правки других процессов — через ChangeProbe (перечитывание целиком).
+
+    Каждое изменение состояния получает номер версии из общего
+    монотонного счётчика — по нему работает long-poll (wait()).
+    Асинхронные подписчики (SSE) получают изменения через asyncio.Queue
+    своего event loop — без потока на соединение.
+    Смены с указанным источником (source) пишутся в журнал событий.
+    Импульс (pulse()) сам возвращает состояние, бывшее до него, через общий
+    планировщик; любая явная команда по устройству отменяет ожидающий возврат.
+
+    Ключ устройства — (номер дома, kind, entrance_no); дом None — устройства
+    без дома (маршруты без номера дома при пустом DEVICE_DEFAULT_HOUSE).
+    Неизвестный номер дома, неизвестный тип устройства или тип не для
+    этого маршрута (подъездный без подъезда и наоборот) — Http404.
+
+    Запись в БД идёт через единственного писателя (api/writer.py) и без
+    замка registry: замок берётся только на чтение/обновление памяти,
+    поэтому GET не ждёт диск. Писатель вызывается только без замка.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._states = {}  # (house_no, kind, entrance_no) -> (pk, state, version)
+        self._house_ids = {None: None}  # номер дома -> pk
+        self._house_numbers = {None: None}  # pk дома -> номер
+        self._loaded = False
+        # старт от времени запуска: после рестарта процесса версии не повторяются
+        self._version = int(time.time() * 1000)
+        self._subscribers = {}  # (house_no, kind, entrance_no) -> {(loop, queue), ...}
+        self._snapshot = (None, None)  # (version, {ключ: state})
+        self._reverts = {}  # ключ -> состояние до импульса, пока возврат ожидает
+        self._probe = ChangeProbe(_fingerprint)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    # ---------- загрузка ----------
+
+    def _ensure_loaded(self, source=None):
+        if self._loaded:
+            if not self._probe.changed():
+                return
+            # правка другого процесса: журнал она уже записала сама
+            source = None
+        self._probe.mark()
+        with primary():
+            rows = list(Device.objects.values_list("pk", "house_id", "house__number", "kind", "entrance_no", "state"))
+        self._house_ids = {None: None}
+        self._house_numbers = {None: None}
+        fresh = {}
+        for pk, house_id, house_no, kind, no, state in rows:
+            self._house_ids[house_no] = house_id
+            self._house_numbers[house_id] = house_no
+            fresh[(house_no, kind, no)] = (pk, state)
+        for key in set(self._states) - set(fresh):
+            del self._states[key]
+        for key, (pk, state) in fresh.items():
+            self._store(key, pk, state, source)
+        self._loaded = True
+
+    def refresh(self):
+        """Подтянуть правки других процессов (ChangeProbe) и вернуть текущую версию."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._version
+
+    def invalidate(self, source=None):
+        """Перечитать устройства из БД (после qs.update, смены номера дома и т. п.)."""
+        with self._lock:
+            was_loaded = self._loaded
+            self._loaded = False
+            if was_loaded:
+                self._ensure_loaded(source)
+
+    def _store(self, key, pk, state, source=None):
+        # вызывается под замком; версия растёт только при реальной смене состояния
+        prev = self._states.get(key)
+        if prev is not None and prev[1] == state:
+            self._states[key] = (pk, state, prev[2])
+            return
+        self._version += 1
+        self._states[key] = (pk, state, self._version)
+        self._changed.notify_all()
+        # новое устройство создаётся выключенным — это не смена состояния
+        if source is not None and (prev is not None or state):
+            journal.record(pk, state, source)
+        for loop, queue in self._subscribers.get(key, ()):
+            try:
+                loop.call_soon_threadsafe(_offer, queue, (state, self._version))
+            except RuntimeError:
+                pass  # event loop подписчика уже закрыт
+
+    def _house_id(self, house_no):
+        # под замком; дома без устройств в карте нет — спрашиваем БД один раз
+        if house_no not in self._house_ids:
+            house_id = House.objects.filter(number=house_no).values_list("pk", flat=True).first()
+            if house_id is None:
+                raise Http404(f"Дом {house_no} не найден")
+            self._house_ids[house_no] = house_id
+            self._house_numbers[house_id] = house_no
+        return self._house_ids[house_no]
+
+    def _key(self, device):
+        # None — дом уже удалён, устройства в памяти быть не должно
+        if device.house_id not in self._house_numbers:
+            house_no = House.objects.filter(pk=device.house_id).values_list("number", flat=True).first()
+            if house_no is None:
+                return None
+            self._house_ids[house_no] = device.house_id
+            self._house_numbers[device.house_id] = house_no
+        return self._house_numbers[device.house_id], device.kind, device.entrance_no
+
+    # ---------- синхронизация с моделью ----------
+
+    def remember(self, device, source=None):
+        with self._lock:
+            key = self._key(device) if self._loaded else None
+            if key is not None:
+                self._store(key, device.pk, device.state, source)
+        self._probe.mark()
+
+    def forget(self, device):
+        with self._lock:
+            if not self._loaded:
+                return
+            if self._states.pop(self._key(device), None) is not None:
+                self._version += 1
+                self._changed.notify_all()
+        self._probe.mark()
+
+    # ---------- чтение / запись ----------
+
+    def get_versioned(self, kind, entrance_no=None, house=None):
+        key = _device_key(house, kind, entrance_no)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._states.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+        return writer.call(self._create, key)
+
+    def _create(self, key):
+        # на потоке писателя: устройство могло появиться, пока задача стояла в очереди
+        house, kind, entrance_no = key
+        with self._lock:
+            entry = self._states.get(key)
+            if entry is not None:
+                return entry[1], entry[2]
+            house_id = self._house_id(house)
+        dev, _ = Device.objects.get_or_create(house_id=house_id, kind=kind, entrance_no=entrance_no)
+        with self._lock:
+            self._store(key, dev.pk, dev.state)
+            result = self._states[key][1:]
+        # своя правка уже в памяти — перечитывать по ChangeProbe нечего
+        self._probe.mark()
+        return result
+
+    def get(self, kind, entrance_no=None, house=None):
+        return self.get_versioned(kind, entrance_no, house)[0]
+
+    def set(self, kind, entrance_no, state, source=SOURCE_API, house=None):
+        key = _device_key(house, kind, entrance_no)
+        self._cancel_revert(key)
+        return writer.call(self._write, key, bool(state), source)
+
+    def _write(self, key, state, source):
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._states.get(key)
+        pk = entry[0] if entry is not None else None
+        if pk is None or not Device.objects.filter(pk=pk).update(state=state, updated_at=timezone.now()):
+            house, kind, entrance_no = key
+            with self._lock:
+                house_id = self._house_id(house)
+            dev, _ = Device.objects.get_or_create(house_id=house_id, kind=kind, entrance_no=entrance_no)
+            Device.objects.filter(pk=dev.pk).update(state=state, updated_at=timezone.now())
+            pk = dev.pk
+        with self._lock:
+            self._store(key, pk, state, source)
+        self._probe.mark()
+        return state
+
+    def pulse(self, kind, entrance_no, state, duration, source=SOURCE_API, house=None):
+        """Установить состояние и через duration секунд вернуть то, что было до импульса."""
+        key = _device_key(house, kind, entrance_no)
+        origin = self._pulse_origin(key)
+        state = self.set(kind, entrance_no, state, source, house)
+        self._schedule_revert(key, origin, duration)
+        return state
+
+    def _pulse_origin(self, key):
+        # импульс поверх ждущего возврата возвращает к состоянию до первого импульса
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._reverts:
+                return self._reverts[key]
+            entry = self._states.get(key)
+            # новое устройство создаётся выключенным
+            return entry[1] if entry is not None else False
+
+    def _schedule_revert(self, key, origin, duration):
+        house, kind, entrance_no = key
+        with self._lock:
+            self._reverts[key] = origin
+        scheduler.schedule(duration, key, self.set, kind, entrance_no, origin, SOURCE_PULSE, house)
+
+    def _cancel_revert(self, key):
+        scheduler.cancel(key)
+        with self._lock:
+            self._reverts.pop(key, None)
+
+    def set_many(self, commands, source=SOURCE_BATCH):
+        """
+        Применить пачку {[house,] kind, entrance_no, state[, pulse]} одной транзакцией:
+        недостающие устройства — одним bulk_create, состояния — одним UPDATE.
+        Возвращает {(house, kind, entrance_no): state}.
+        """
+        keys = [(c.get("house"), c["kind"], c.get("entrance_no")) for c in commands]
+        wanted = {key: bool(c["state"]) for key, c in zip(keys, commands)}
+        if not wanted:
+            return {}
+        # повтор ключа в пачке — как и для состояния, действует последняя команда
+        pulses = {key: c.get("pulse") for key, c in zip(keys, commands)}
+        reverts = {key: (duration, self._pulse_origin(key)) for key, duration in pulses.items() if duration}
+        for key in wanted:
+            self._cancel_revert(key)
+        return writer.call(self._write_many, wanted, reverts, source)
+
+    def _write_many(self, wanted, reverts, source):
+        with self._lock:
+            self._ensure_loaded()
+            pks = {key: self._states[key][0] for key in wanted if key in self._states}
+            missing = [key for key in wanted if key not in pks]
+            if missing:
+                unknown = {house for house, _, _ in missing} - set(self._house_ids)
+                if unknown:
+                    self._house_ids.update(
+                        House.objects.filter(number__in=unknown).values_list("number", "pk")
+                    )
+                    self._house_numbers.update((pk, no) for no, pk in self._house_ids.items())
+                    if unknown - set(self._house_ids):
+                        raise Http404(f"Дом {min(unknown - set(self._house_ids))} не найден")
+                house_ids = {house: self._house_ids[house] for house, _, _ in missing}
+                house_numbers = {pk: house for house, pk in house_ids.items()}
+
+        with transaction.atomic():
+            if missing:
+                Device.objects.bulk_create(
+                    [Device(house_id=house_ids[house], kind=kind, entrance_no=no) for house, kind, no in missing],
+                    ignore_conflicts=True,
+                )
+                missing_kinds = {kind for _, kind, _ in missing}
+                for pk, house_id, kind, no in Device.objects.filter(kind__in=missing_kinds).order_by().values_list(
+                    "pk", "house_id", "kind", "entrance_no"
+                ):
+                    key = (house_numbers.get(house_id), kind, no)
+                    if key in wanted:
+                        pks[key] = pk
+
+            Device.objects.filter(pk__in=pks.values()).update(
+                state=Case(
+                    *(When(pk=pk, then=Value(wanted[key])) for key, pk in pks.items()),
+                    default=F("state"),
+                ),
+                updated_at=timezone.now(),
+            )
+            # контекст (кто меняет — для журнала) — на момент команды, commit может быть позже
+            context = contextvars.copy_context()
+            transaction.on_commit(lambda: context.run(self._store_many, pks, wanted, source, reverts))
+        return wanted
+
+    def _store_many(self, pks, states, source, reverts):
+        with self._lock:
+            for key, pk in pks.items():
+                self._store(key, pk, states[key], source)
+        self._probe.mark()
+        for key, (duration, origin) in reverts.items():
+            self._schedule_revert(key, origin, duration)
+
+    def wait(self, kind, entrance_no, since, timeout, house=None):
+        """
+        Long-poll: вернуть (state, version), как только версия устройства
+        станет больше since, или по истечении timeout секунд.
+        """
+        key = (house, kind, entrance_no)
+        deadline = time.monotonic() + timeout
+        # создание неизвестного устройства идёт через писателя — до замка
+        state, version = self.get_versioned(kind, entrance_no, house)
+        with self._lock:
+            while True:
+                entry = self._states.get(key)
+                if entry is not None:
+                    state, version = entry[1], entry[2]
+                # since из будущего — процесс перезапускался, отвечаем сразу
+                if not version <= since <= self._version:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # смену из другого процесса не разбудит notify — просыпаемся на проверку
+                self._changed.wait(min(remaining, self._probe.interval or remaining))
+                self._ensure_loaded()
+            return state, version
+
+    def snapshot(self):
+        """
+        (version, {"h1:door:3": True, "h1:parking": False, "h2:door:3": True, ...})
+        — все устройства разом; без префикса h<номер>: — устройства без дома.
+        Словарь собирается один раз на версию.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            version, devices = self._snapshot
+            if version != self._version:
+                devices = {
+                    _snapshot_key(house, kind, no): entry[1]
+                    for (house, kind, no), entry in sorted(
+                        self._states.items(),
+                        key=lambda item: (item[0][0] or 0, item[0][2] or 0, item[0][1]),
+                    )
+                }
+                self._snapshot = (self._version, devices)
+            return self._snapshot
+
+    # ---------- asyncio ----------
+
+    async def aget_versioned(self, kind, entrance_no=None, house=None):
+        """Попадание — прямо в event loop; загрузка и промах — в пуле потоков."""
+        key = (house, kind, entrance_no)
+        with self._lock:
+            # проверка правок других процессов — запрос к БД, его тоже в пул
+            entry = self._states.get(key) if self._loaded and not self._probe.due() else None
+            if entry is not None:
+                self.hits += 1
+                return entry[1], entry[2]
+        return await sync_to_async(self.get_versioned, thread_sensitive=False)(kind, entrance_no, house)
+
+    async def aget(self, kind, entrance_no=None, house=None):
+        return (await self.aget_versioned(kind, entrance_no, house))[0]
+
+    async def aset(self, kind, entrance_no, state, source=SOURCE_API, house=None):
+        key = _device_key(house, kind, entrance_no)
+        self._cancel_revert(key)
+        return await writer.acall(self._write, key, bool(state), source)
+
+    async def apulse(self, kind, entrance_no, state, duration, source=SOURCE_API, house=None):
+        key = _device_key(house, kind, entrance_no)
+        # _pulse_origin может перечитать registry (ChangeProbe, загрузка) — запрос к БД не в event loop
+        origin = await sync_to_async(self._pulse_origin, thread_sensitive=False)(key)
+        state = await self.aset(kind, entrance_no, state, source, house)
+        self._schedule_revert(key, origin, duration)
+        return state
+
+    # ---------- подписки (asyncio) ----------
+
+    def subscribe(self, kind, entrance_no=None, house=None):
+        """Очередь (state, version) для текущего event loop."""
+        queue = asyncio.Queue(maxsize=16)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault((house, kind, entrance_no), set()).add(entry)
+        return queue
+
+    def unsubscribe(self, kind, entrance_no, queue, house=None):
+        key = (house, kind, entrance_no)
+        with self._lock:
+            subs = self._subscribers.get(key, set())
+            subs.difference_update({e for e in subs if e[1] is queue})
+            if not subs:
+                self._subscribers.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._states),
+                "loaded": self._loaded,
+                "version": self._version,
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+def _device_key(house, kind, entrance_no):
+    # то же, что ограничение device_entrance_rules: иначе get_or_create на писателе — IntegrityError
+    if kind not in (ENTRANCE_KINDS if entrance_no is not None else GLOBAL_KINDS):
+        raise Http404(f"Устройства {kind} на этом маршруте нет")
+    return house, kind, entrance_no
+
+
+def _fingerprint():
+    # qs.update() registry и админки тоже ставят updated_at
+    return Device.objects.aggregate(Count("pk"), Max("pk"), Max("updated_at"))
+
+
+def _snapshot_key(house, kind, no):
+    key = f"{kind}:{no}" if no is not None else kind
+    return f"h{house}:{key}" if house is not None else key
+
+
+def _offer(queue, item):
+    # медленный подписчик: важна только свежая версия, старые события выкидываем
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+
+registry = DeviceRegistry()
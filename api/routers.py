@@ -0,0 +1,157 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# чтения запроса можно отдать реплике (ставит ReplicaMiddleware для отмеченных view)
+_replica_reads = ContextVar("replica_reads", default=False)
+# после первой записи в запросе (или внутри primary()) всё читается с default
+_pinned = ContextVar("db_pinned", default=False)
+
+# как часто перепроверять отставание реплики (сек)
+LAG_CHECK_INTERVAL = 1.0
+
+# сессии и пользователи — всегда с default: только что вошедший не должен
+# стать анонимом на отмеченных view, пока реплика отстаёт
+PRIMARY_APPS = {"sessions", "auth", "contenttypes"}
+
+
+@contextmanager
+def primary():
+    """
+    Чтения внутри блока — только с default. Для кэшей процесса (registry,
+    identity_cache, directory, search_index): собранные с отстающей реплики,
+    они остались бы устаревшими до следующей инвалидации.
+    """
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _sqlite_mtime(name):
+    # в WAL-режиме свежие страницы сначала попадают в -wal
+    return max(
+        (os.path.getmtime(path) for path in (str(name), f"{name}-wal") if os.path.exists(path)),
+        default=0.0,
+    )
+
+
+class ReplicaLag:
+    """
+    Отставание реплик, секунды. Для SQLite-копий (manage.py sync_replicas):
+    если default менялся после последней синхронизации — сколько прошло
+    с неё, иначе 0. Для других движков реплика считается свежей.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}  # alias -> (monotonic, lag)
+
+    def get(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is not None and now - checked[0] < LAG_CHECK_INTERVAL:
+            return checked[1]
+        lag = self.measure(alias)
+        with self._lock:
+            self._checked[alias] = (now, lag)
+        return lag
+
+    @staticmethod
+    def measure(alias):
+        replica = connections.settings[alias]
+        source = connections.settings[DEFAULT_DB_ALIAS]
+        if not (replica["ENGINE"] == source["ENGINE"] == "django.db.backends.sqlite3"):
+            return 0.0
+        synced = _sqlite_mtime(replica["NAME"])
+        if not synced:
+            return float("inf")
+        if _sqlite_mtime(source["NAME"]) <= synced:
+            return 0.0
+        return max(0.0, time.time() - synced)
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+replica_lag = ReplicaLag()
+
+
+class ReplicaRouter:
+    """
+    Чтения отмеченных view (replica_reads = True, только GET/HEAD) — на случайную
+    реплику из DATABASE_REPLICAS, отстающую не больше REPLICA_MAX_LAG секунд.
+    Запись всегда на default и до конца запроса закрепляет чтения за ним же
+    (read-after-write); сессии и пользователи (PRIMARY_APPS) — тоже с default.
+    Миграции — только default: реплики — копии.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _pinned.get() or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        fresh = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if replica_lag.get(alias) <= settings.REPLICA_MAX_LAG
+        ]
+        return random.choice(fresh) if fresh else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты с разных алиасов — одни и те же строки
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Разрешает чтение с реплик на время запроса к view с replica_reads = True.
+    Работает и в sync, и в async-цепочке — async view не уходят в поток ради неё.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        reads = _replica_reads.set(False)
+        pinned = _pinned.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(pinned)
+            _replica_reads.reset(reads)
+
+    async def __acall__(self, request):
+        reads = _replica_reads.set(False)
+        pinned = _pinned.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            _pinned.reset(pinned)
+            _replica_reads.reset(reads)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, "view_class", None) or getattr(view_func, "cls", None)
+        if request.method in ("GET", "HEAD") and getattr(view, "replica_reads", False):
+            _replica_reads.set(True)
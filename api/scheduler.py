@@ -0,0 +1,74 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Отложенные вызовы на одном потоке (куча по времени срабатывания).
+
+    У каждой задачи есть ключ: повторный schedule() с тем же ключом
+    заменяет прежнюю задачу, cancel() снимает её. Отменённые записи
+    не удаляются из кучи, а пропускаются при срабатывании.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []  # (due, token, key, fn, args)
+        self._tokens = {}  # key -> token актуальной задачи
+        self._counter = itertools.count()
+        self._thread = None
+
+    def schedule(self, delay, key, fn, *args):
+        with self._cond:
+            token = next(self._counter)
+            self._tokens[key] = token
+            heapq.heappush(self._heap, (time.monotonic() + delay, token, key, fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="device-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            return self._tokens.pop(key, None) is not None
+
+    def pending(self):
+        with self._cond:
+            return len(self._tokens)
+
+    def _next_due(self):
+        # под замком: ждём ближайшую актуальную задачу
+        while True:
+            while not self._heap:
+                self._cond.wait()
+            due, token, key, fn, args = self._heap[0]
+            if self._tokens.get(key) != token:
+                heapq.heappop(self._heap)
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            del self._tokens[key]
+            return fn, args
+
+    def _run(self):
+        while True:
+            with self._cond:
+                fn, args = self._next_due()
+            try:
+                close_old_connections()
+                fn(*args)
+            except Exception:
+                logger.exception("Ошибка отложенной задачи %r", fn)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,210 @@
+import threading
+from collections import defaultdict
+
+from django.db.models import Count, Max, Sum
+
+from .changes import ChangeProbe
+from .models import Apartment, Entrance, House, ResidentProfile, SimpleUser
+from .routers import primary
+
+APARTMENT = "apartment"
+RESIDENT = "resident"
+
+
+def _tokens(*values, digits=True):
+    tokens = []
+    for value in values:
+        if value in (None, ""):
+            continue
+        value = str(value).lower()
+        tokens.extend(value.split())
+        if digits:
+            only_digits = "".join(ch for ch in value if ch.isdigit())
+            if len(only_digits) > 3 and only_digits not in tokens:
+                tokens.append(only_digits)  # +7 (900) 123-45-67 → 79001234567
+    return tuple(dict.fromkeys(tokens))
+
+
+def _grams(token):
+    # все подстроки длиной 1..3: короткий запрос — одна выборка, длинный — пересечение триграмм
+    for size in (1, 2, 3):
+        for i in range(len(token) - size + 1):
+            yield token[i:i + size]
+
+
+class SearchIndex:
+    """
+    Поиск квартир и резидентов в памяти процесса по n-граммам (1..3 символа).
+
+    Строится при первом запросе, дальше обновляется сигналами save/delete
+    (api/signals.py); правки других процессов — перестроением по ChangeProbe. Семантика как у admin search (icontains, все слова
+    запроса должны встретиться), но без сканирования таблиц.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}  # (type, pk) -> (tokens, payload)
+        self._postings = defaultdict(set)  # gram -> {(type, pk), ...}
+        self._loaded = False
+        self._probe = ChangeProbe(_fingerprint)
+
+    # ---------- построение ----------
+
+    @primary()
+    def _ensure_loaded(self):
+        if self._loaded and not self._probe.changed():
+            return
+        self._probe.mark()
+        self._docs.clear()
+        self._postings.clear()
+        for row in Apartment.objects.values(
+            "pk", "number", "owner_name", "entrance__number", "entrance__house__number"
+        ):
+            self._put(*self._apartment_doc(row))
+        for row in ResidentProfile.objects.values(
+            "pk", "user_id", "user__login", "user__name", "apartment_no", "phone", "car_number"
+        ):
+            self._put(*self._resident_doc(row))
+        self._loaded = True
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    @staticmethod
+    def _apartment_doc(row):
+        payload = {
+            "type": APARTMENT,
+            "id": row["pk"],
+            "house": row["entrance__house__number"],
+            "entrance": row["entrance__number"],
+            "number": row["number"],
+            "owner_name": row["owner_name"],
+        }
+        return (APARTMENT, row["pk"]), _tokens(row["number"], row["owner_name"]), payload
+
+    @staticmethod
+    def _resident_doc(row):
+        payload = {
+            "type": RESIDENT,
+            "id": row["pk"],
+            "user_id": row["user_id"],
+            "login": row["user__login"],
+            "name": row["user__name"],
+            "apartment_no": row["apartment_no"],
+            "phone": row["phone"],
+            "car_number": row["car_number"],
+        }
+        tokens = _tokens(
+            row["user__login"], row["user__name"], row["apartment_no"], row["phone"], row["car_number"]
+        )
+        return (RESIDENT, row["pk"]), tokens, payload
+
+    def _put(self, key, tokens, payload):
+        self._drop(key)
+        self._docs[key] = (tokens, payload)
+        for token in tokens:
+            for gram in _grams(token):
+                self._postings[gram].add(key)
+
+    def _drop(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for token in doc[0]:
+            for gram in _grams(token):
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._postings[gram]
+
+    # ---------- инкрементальные обновления ----------
+
+    @primary()
+    def update_apartment(self, pk):
+        row = Apartment.objects.filter(pk=pk).values(
+            "pk", "number", "owner_name", "entrance__number", "entrance__house__number"
+        ).first()
+        with self._lock:
+            if not self._loaded:
+                return
+            if row is None:
+                self._drop((APARTMENT, pk))
+            else:
+                self._put(*self._apartment_doc(row))
+        # своя правка уже в индексе — перестраивать по ChangeProbe нечего
+        self._probe.mark()
+
+    @primary()
+    def update_residents(self, **lookup):
+        rows = list(ResidentProfile.objects.filter(**lookup).values(
+            "pk", "user_id", "user__login", "user__name", "apartment_no", "phone", "car_number"
+        ))
+        with self._lock:
+            if not self._loaded:
+                return
+            for row in rows:
+                self._put(*self._resident_doc(row))
+        self._probe.mark()
+
+    def remove(self, doc_type, pk):
+        with self._lock:
+            self._drop((doc_type, pk))
+        self._probe.mark()
+
+    # ---------- поиск ----------
+
+    def search(self, query, doc_type=None, limit=20):
+        """Список payload, лучшие совпадения первыми."""
+        words = _tokens(query, digits=False)
+        if not words:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            candidates = None
+            for word in words:
+                grams = [word] if len(word) <= 3 else [word[i:i + 3] for i in range(len(word) - 2)]
+                found = set.intersection(*(self._postings.get(g, set()) for g in grams))
+                candidates = found if candidates is None else candidates & found
+                if not candidates:
+                    return []
+
+            scored = []
+            for key in candidates:
+                if doc_type and key[0] != doc_type:
+                    continue
+                tokens, payload = self._docs[key]
+                score = 0
+                for word in words:
+                    best = max(
+                        (3 if t == word else 2 if t.startswith(word) else 1 if word in t else 0)
+                        for t in tokens
+                    )
+                    if not best:
+                        break
+                    score += best
+                else:
+                    scored.append((-score, key, payload))
+
+        scored.sort(key=lambda item: item[:2])
+        if limit is not None:
+            scored = scored[:limit]
+        return [{**payload, "score": -score} for score, _, payload in scored]
+
+    def search_ids(self, query, doc_type):
+        return [item["id"] for item in self.search(query, doc_type, limit=None)]
+
+
+def _fingerprint():
+    # всё, что попадает в документы: квартиры, профили, логины и имена, номера домов и подъездов
+    return (
+        Apartment.objects.aggregate(Count("pk"), Max("pk"), Max("updated_at")),
+        ResidentProfile.objects.aggregate(Count("pk"), Max("pk"), Max("updated_at")),
+        SimpleUser.objects.aggregate(Max("updated_at")),
+        House.objects.aggregate(Sum("number")),
+        Entrance.objects.aggregate(Sum("number")),
+    )
+
+
+search_index = SearchIndex()
@@ -1,6 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
-    SimpleUser, House, Entrance, Apartment, Device
+    SimpleUser, House, Entrance, Apartment, Device, DeviceEvent, ENTRANCE_KINDS
 )
 
 class SimpleUserSerializer(serializers.ModelSerializer):
@@ -76,3 +77,62 @@ class ApartmentListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Apartment
         fields = ["id", "house", "entrance", "number", "is_blocked"]
+
+
+def pulse_seconds(value):
+    """
+    pulse: true — длительность по умолчанию, число — секунды (не больше DEVICE_PULSE_MAX),
+    отсутствует / false / 0 — обычная команда без авто-возврата.
+    """
+    # bool — до чисел: True == 1, и {"pulse": 1} иначе стал бы импульсом по умолчанию
+    if isinstance(value, bool):
+        return settings.DEVICE_PULSE_SECONDS if value else None
+    if value in (None, "", "false"):
+        return None
+    if value == "true":
+        return settings.DEVICE_PULSE_SECONDS
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError("Ожидается true или число секунд")
+    if not seconds > 0:  # и NaN
+        return None
+    return min(seconds, settings.DEVICE_PULSE_MAX)
+
+
+class PulseField(serializers.Field):
+    def to_internal_value(self, data):
+        return pulse_seconds(data)
+
+    def to_representation(self, value):
+        return value
+
+
+class DeviceCommandSerializer(serializers.Serializer):
+    house = serializers.IntegerField(min_value=1, allow_null=True, required=False, default=None)
+    kind = serializers.ChoiceField(choices=Device.KIND_CHOICES)
+    entrance_no = serializers.IntegerField(min_value=1, allow_null=True, required=False, default=None)
+    state = serializers.BooleanField()
+    pulse = PulseField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs["house"] is None:
+            # как маршруты без номера дома
+            attrs["house"] = settings.DEVICE_DEFAULT_HOUSE
+        needs_entrance = attrs["kind"] in ENTRANCE_KINDS
+        if needs_entrance and attrs["entrance_no"] is None:
+            raise serializers.ValidationError({"entrance_no": "Обязателен для этого типа устройства"})
+        if not needs_entrance and attrs["entrance_no"] is not None:
+            raise serializers.ValidationError({"entrance_no": "Не указывается для этого типа устройства"})
+        return attrs
+
+
+class DeviceEventSerializer(serializers.ModelSerializer):
+    house = serializers.IntegerField(source="device.house.number", read_only=True, default=None)
+    kind = serializers.CharField(source="device.kind", read_only=True)
+    entrance_no = serializers.IntegerField(source="device.entrance_no", read_only=True)
+    source = serializers.CharField(source="get_source_display", read_only=True)
+
+    class Meta:
+        model = DeviceEvent
+        fields = ["id", "house", "kind", "entrance_no", "state", "source", "actor", "created_at"]
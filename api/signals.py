@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import identity_cache
+from .directory import directory
+from .metrics import track_queries
+from .models import (
+    Device, SimpleUser, ResidentProfile, House, Entrance, Apartment, SOURCE_ADMIN
+)
+from .registry import registry
+from .search import search_index, APARTMENT, RESIDENT
+
+
+# ---------- DB ----------
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    track_queries(connection)
+
+
+# ---------- USERS ----------
+
+@receiver([post_save, post_delete], sender=SimpleUser)
+def user_changed(sender, instance, signal, **kwargs):
+    identity_cache.invalidate(instance.pk)
+    if signal is post_save:
+        transaction.on_commit(lambda: search_index.update_residents(user_id=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=ResidentProfile)
+def profile_changed(sender, instance, signal, **kwargs):
+    identity_cache.invalidate(instance.user_id)
+    if signal is post_save:
+        transaction.on_commit(lambda: search_index.update_residents(pk=instance.pk))
+    else:
+        transaction.on_commit(lambda: search_index.remove(RESIDENT, instance.pk))
+
+
+# ---------- HOUSES & APARTMENTS ----------
+
+@receiver(post_save, sender=Apartment)
+def apartment_saved(sender, instance, **kwargs):
+    transaction.on_commit(directory.invalidate)
+    transaction.on_commit(lambda: search_index.update_apartment(instance.pk))
+
+
+@receiver(post_delete, sender=Apartment)
+def apartment_deleted(sender, instance, **kwargs):
+    transaction.on_commit(directory.invalidate)
+    transaction.on_commit(lambda: search_index.remove(APARTMENT, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=House)
+@receiver([post_save, post_delete], sender=Entrance)
+def structure_changed(sender, instance, **kwargs):
+    transaction.on_commit(directory.invalidate)
+    # номера дома/подъезда лежат в документах квартир — дешевле перестроить
+    transaction.on_commit(search_index.invalidate)
+    if sender is House:
+        # номер дома входит в ключ устройства в registry
+        transaction.on_commit(registry.invalidate)
+
+
+# ---------- DEVICES ----------
+
+@receiver(post_save, sender=Device)
+def device_saved(sender, instance, created, **kwargs):
+    # после коммита: откатанная транзакция не должна попасть в память;
+    # сохранение модели вне registry — это правка из админки
+    source = None if created else SOURCE_ADMIN
+    transaction.on_commit(lambda: registry.remember(instance, source))
+
+
+@receiver(post_delete, sender=Device)
+def device_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: registry.forget(instance))
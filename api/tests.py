@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import types
+from contextlib import closing
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from django.views import View
+
+from .authentication import identity_cache, issue_token
+from .directory import directory
+from .journal import EventJournal, acting_as, current_actor, journal
+from .metrics import LATENCY_BUCKETS, UNMATCHED, request_metrics
+from .models import (
+    SimpleUser, ResidentProfile, House, Entrance, Apartment, Device, DeviceEvent, SOURCE_API
+)
+from .registry import registry
+from .routers import ReplicaLag, replica_lag
+from .scheduler import Scheduler
+from .search import RESIDENT, search_index
+from .throttling import SlidingWindowLimiter, login_ip_limiter, login_name_limiter
+from .urls import build_urlpatterns
+from .writer import SerialWriter
+
+# журнал устройств без фонового потока: он писал бы в общую тестовую БД
+# по своему таймеру, посреди чужой транзакции («database table is locked»);
+# события пишет journal.flush() в tearDown тестов
+_journal_without_thread = override_settings(DEVICE_JOURNAL_FLUSH_INTERVAL=0)
+
+
+def setUpModule():
+    _journal_without_thread.enable()
+
+
+def tearDownModule():
+    _journal_without_thread.disable()
+
+
+# маршруты с async-версиями логина и команд устройств (DJANGO_ASYNC_VIEWS=1)
+ASYNC_URLS = types.ModuleType("api_async_urls")
+ASYNC_URLS.urlpatterns = build_urlpatterns(async_views=True)
+
+
+def captured_sql(ctx):
+    return "\n".join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Число запросов страницы списка в админке не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.houses = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.houses += 1
+            house = House.objects.create(number=self.houses)
+            entrance = Entrance.objects.create(house=house, number=1)
+            apartment = Apartment.objects.create(entrance=entrance, number=str(self.houses))
+            user = SimpleUser.objects.create(login=f"{self.houses}-1", password="x", name=f"Жилец {self.houses}")
+            ResidentProfile.objects.create(user=user, apartment_no=apartment.number, entrance_no=1)
+            device = Device.objects.create(house=house, kind="door", entrance_no=1)
+            DeviceEvent.objects.create(device=device, state=True, source=1)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return ctx
+
+    def assertConstantQueries(self, url):
+        self.add_rows(2)
+        small = self.count_queries(url)
+        self.add_rows(20)
+        large = self.count_queries(url)
+        if len(large) != len(small):
+            self.fail(f"{url}: {len(small)} запросов на 2 строки, {len(large)} на 22:\n{captured_sql(large)}")
+
+    def test_house_changelist(self):
+        self.assertConstantQueries("/admin/api/house/")
+
+    def test_house_changelist_sorted_by_count(self):
+        self.assertConstantQueries("/admin/api/house/?o=-2")
+
+    def test_entrance_changelist(self):
+        self.assertConstantQueries("/admin/api/entrance/")
+
+    def test_apartment_changelist(self):
+        self.assertConstantQueries("/admin/api/apartment/")
+
+    def test_residentprofile_changelist(self):
+        self.assertConstantQueries("/admin/api/residentprofile/")
+
+    def test_simpleuser_changelist(self):
+        self.assertConstantQueries("/admin/api/simpleuser/")
+
+    def test_device_changelist(self):
+        self.assertConstantQueries("/admin/api/device/")
+
+    def test_deviceevent_changelist(self):
+        self.assertConstantQueries("/admin/api/deviceevent/")
+
+    def test_annotated_counts(self):
+        house = House.objects.create(number=1)
+        for no in (1, 2):
+            entrance = Entrance.objects.create(house=house, number=no)
+            Apartment.objects.bulk_create([Apartment(entrance=entrance, number=f"{no}{i}") for i in range(3)])
+
+        response = self.client.get("/admin/api/house/")
+        obj = response.context["cl"].result_list[0]
+        self.assertEqual((obj.entrances_count, obj.apartments_count), (2, 6))
+
+
+# два дома разной формы — как у seed_residents --layout
+SEED_LAYOUT = {"1": {"1": [1, 4], "2": [5, 8]}, "2": {"1": [1, 3]}}
+
+
+@override_settings(PROCESS_CACHE_CHECK_INTERVAL=0)
+class EndpointQueryBudgetTests(TestCase):
+    """
+    Бюджет запросов к БД на каждый endpoint и страницу админки (данные seed_residents).
+    Проверка правок других процессов (ChangeProbe) выключена: её запрос раз
+    в секунду попадал бы в случайный тест.
+
+    Справочник и поиск перед каждым тестом сброшены — бюджет для холодного
+    пути, тёплый отдельно: ноль запросов. registry загружен (один запрос на
+    процесс): устройства считаются на тёплом пути, без токена — как контроллеры.
+    Пользователь по токену уже в кэше; холодный путь — в test_me.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "layout.json")
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(SEED_LAYOUT, fh)
+            call_command("seed_residents", layout=path, stdout=StringIO())
+
+        cls.resident = SimpleUser.objects.get(login="1-1-1")
+        cls.staff = SimpleUser.objects.create(login="admin", password="x", name="Админ", role="admin")
+        cls.superuser = User.objects.create_superuser("admin", "admin@example.com", "pw")
+
+        devices = Device.objects.bulk_create([
+            Device(house=entrance.house, kind="door", entrance_no=entrance.number)
+            for entrance in Entrance.objects.select_related("house")
+        ] + [Device(house=house, kind="kalitka1") for house in House.objects.all()])
+        DeviceEvent.objects.bulk_create([
+            DeviceEvent(device=device, state=state, source=1)
+            for device in devices for state in (True, False)
+        ])
+
+    def setUp(self):
+        registry.invalidate()
+        registry.snapshot()
+        directory.invalidate()
+        search_index.invalidate()
+        identity_cache.clear()
+        for user in (self.resident, self.staff):
+            identity_cache.get(user.pk)
+
+    def tearDown(self):
+        # импульс из test_device_commands: возврат (scheduler.cancel) сработал бы после теста
+        registry._cancel_revert((1, "door", 1))
+        # события команд — в тестовую БД, а не atexit-сбросом после её удаления
+        journal.flush()
+
+    def bearer(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {issue_token(user)[0]}"}
+
+    def request(self, method, url, data=None, user=None):
+        headers = self.bearer(user) if user else {}
+        if method == "post":
+            return self.client.post(url, data, content_type="application/json", **headers)
+        return self.client.get(url, **headers)
+
+    def assertMaxQueries(self, budget, method, url, data=None, user=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.request(method, url, data, user)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}")
+        if len(ctx) > budget:
+            self.fail(
+                f"{method.upper()} {url}: {len(ctx)} запросов при бюджете {budget}:\n{captured_sql(ctx)}"
+            )
+
+    def assertBudgets(self, budgets, method="get", user=None):
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertMaxQueries(budget, method, url, user=user)
+
+    # ---------- auth ----------
+
+    def test_login(self):
+        # профиль — в том же запросе (select_related), сериализатор не догружает
+        self.assertMaxQueries(1, "post", "/api/auth/login/", {"login": "1-1-1", "password": "1"})
+
+    def test_me(self):
+        identity_cache.clear()
+        self.assertMaxQueries(1, "get", "/api/auth/me/", user=self.resident)
+        self.assertMaxQueries(0, "get", "/api/auth/me/", user=self.resident)
+
+    # ---------- lists ----------
+
+    def test_lists(self):
+        # номера страниц — COUNT и страница; курсор и карточка — один запрос
+        self.assertBudgets([
+            ("/api/houses/", 1),
+            ("/api/entrances/", 1),
+            ("/api/entrances/?house=1", 1),
+            ("/api/apartments/", 2),
+            ("/api/apartments/?cursor=", 1),
+            ("/api/apartments/?house=1&entrance=2", 2),
+            (f"/api/apartments/{Apartment.objects.first().pk}/", 1),
+        ], user=self.resident)
+        self.assertBudgets([
+            ("/api/devices/events/", 1),
+            ("/api/devices/events/?house=1&kind=door", 1),
+        ], user=self.staff)
+
+    def test_directory_and_search(self):
+        # справочник — дома, подъезды, квартиры; поиск — квартиры и профили
+        self.assertBudgets([("/api/directory/", 3), ("/api/search/?q=1", 2)], user=self.resident)
+        self.assertBudgets([("/api/directory/", 0), ("/api/search/?q=1", 0)], user=self.resident)
+
+    def test_export(self):
+        self.assertBudgets(
+            [(f"/api/export/{dataset}.csv", 1) for dataset in ("residents", "apartments", "devices")],
+            user=self.staff,
+        )
+
+    # ---------- devices ----------
+
+    def test_device_reads(self):
+        self.assertBudgets([
+            ("/api/houses/1/entrances/2/door/", 0),
+            ("/api/houses/2/kalitka1/", 0),
+            ("/api/devices/", 0),
+            ("/api/houses/1/entrances/1/door/poll/?since=-1", 0),
+        ])
+
+    def test_device_commands(self):
+        # только UPDATE: id и состояние устройства — из registry, журнал пишется в фоне
+        self.assertMaxQueries(1, "post", "/api/houses/1/entrances/1/door/", {"state": True})
+        self.assertMaxQueries(1, "post", "/api/houses/1/entrances/1/door/", {"state": True, "pulse": 5})
+        self.assertMaxQueries(3, "post", "/api/devices/batch/", [
+            {"house": 1, "kind": "door", "entrance_no": no, "state": True} for no in (1, 2)
+        ] + [{"house": 2, "kind": "kalitka1", "state": True}])
+
+    # ---------- admin ----------
+
+    def test_admin_changelists(self):
+        # сессия, пользователь, два COUNT (с фильтром и без), строки, права для меню;
+        # остальное — варианты list_filter. От числа строк не зависит (см. выше)
+        budgets = {
+            "simpleuser": 7,
+            "residentprofile": 9,
+            "house": 7,
+            "entrance": 8,
+            "apartment": 9,
+            "device": 9,
+            "deviceevent": 9,
+        }
+        self.client.force_login(self.superuser)
+        for model, budget in budgets.items():
+            with self.subTest(model=model):
+                url = f"/admin/api/{model}/"
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if len(ctx) > budget:
+                    self.fail(f"{url}: {len(ctx)} запросов при бюджете {budget}:\n{captured_sql(ctx)}")
+
+
+class SearchAccessTests(TestCase):
+    """Поиск: без входа — 401, жильцы с телефонами и логинами — только администрации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        entrance = Entrance.objects.create(house=house, number=3)
+        Apartment.objects.create(entrance=entrance, number="125")
+        cls.resident = SimpleUser.objects.create(login="125-3", password="125", name="Иванов")
+        ResidentProfile.objects.create(
+            user=cls.resident, apartment_no="125", entrance_no=3, phone="+79001234567", car_number="А125АА"
+        )
+        cls.staff = SimpleUser.objects.create(login="admin", password="x", name="Админ", role="admin")
+
+    def setUp(self):
+        search_index.invalidate()
+
+    def search(self, query, user=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {issue_token(user)[0]}"} if user else {}
+        return self.client.get(f"/api/search/?{query}", **headers)
+
+    def test_anonymous(self):
+        self.assertEqual(self.search("q=125").status_code, 401)
+
+    def test_resident_sees_apartments_only(self):
+        response = self.search("q=125", self.resident)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item["type"] for item in response.json()}, {"apartment"})
+        # по телефону жильца ничего не находится
+        self.assertEqual(self.search("q=9001234567", self.resident).json(), [])
+        self.assertEqual(self.search("q=125&type=resident", self.resident).status_code, 403)
+
+    def test_administrator_sees_residents(self):
+        response = self.search("q=9001234567", self.staff)
+        self.assertEqual(response.status_code, 200)
+        [item] = response.json()
+        self.assertEqual((item["type"], item["login"], item["car_number"]), ("resident", "125-3", "А125АА"))
+
+
+class StaleTokenTests(TestCase):
+    """Просроченный Bearer мешает только view, которым нужен пользователь."""
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=3)
+        user = SimpleUser.objects.create(login="1-3", password="1", name="Жилец")
+        with mock.patch("api.authentication.timezone.now", return_value=timezone.now() - timedelta(hours=1)):
+            cls.expired = issue_token(user)[0]
+
+    def setUp(self):
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    def test_public_endpoints_ignore_token(self):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {self.expired}"}
+        for url in ("/api/entrances/3/door/", "/api/houses/", "/api/apartments/", "/api/devices/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, **headers).status_code, 200)
+        response = self.client.post(
+            "/api/entrances/3/door/", {"state": True}, content_type="application/json", **headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_identity_endpoints_reject_token(self):
+        response = self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {self.expired}")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+
+
+class DevicePulseTests(TestCase):
+    """Импульс: разбор длительности и возврат к состоянию до импульса."""
+
+    URL = "/api/houses/1/entrances/1/door/"
+    KEY = (1, "door", 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=1)
+
+    def setUp(self):
+        registry.invalidate()
+        # возврат не ждём: вызываем запланированное вручную
+        patcher = mock.patch("api.registry.scheduler.schedule")
+        self.schedule = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        registry._reverts.clear()
+        journal.flush()
+
+    def post(self, data, url=None):
+        return self.client.post(url or self.URL, data, content_type="application/json")
+
+    def state(self):
+        return registry.get("door", 1, 1)
+
+    def fire(self):
+        delay, key, fn, *args = self.schedule.call_args.args
+        self.assertEqual(key, self.KEY)
+        fn(*args)
+
+    def test_number_is_seconds(self):
+        self.assertEqual(self.post({"state": True, "pulse": 1}).status_code, 200)
+        self.assertEqual(self.schedule.call_args.args[0], 1.0)
+        self.assertTrue(self.state())
+        self.fire()
+        self.assertFalse(self.state())
+
+    def test_true_is_default_duration(self):
+        self.post({"state": True, "pulse": True})
+        self.assertEqual(self.schedule.call_args.args[0], settings.DEVICE_PULSE_SECONDS)
+        self.post({"state": True, "pulse": 1000})
+        self.assertEqual(self.schedule.call_args.args[0], settings.DEVICE_PULSE_MAX)
+
+    def test_false_and_invalid(self):
+        self.post({"state": True, "pulse": False})
+        self.schedule.assert_not_called()
+        self.assertEqual(self.post({"state": True, "pulse": "скоро"}).status_code, 400)
+
+    def test_open_door_stays_open(self):
+        registry.set("door", 1, True, house=1)
+        self.post({"state": True, "pulse": 1})
+        self.fire()
+        self.assertTrue(self.state())
+        self.post({"state": False, "pulse": 1})
+        self.assertFalse(self.state())
+        self.fire()
+        self.assertTrue(self.state())
+
+    def test_repeated_pulse_restores_original(self):
+        self.post({"state": True, "pulse": 1})
+        self.post({"state": True, "pulse": 1})
+        self.fire()
+        self.assertFalse(self.state())
+
+    def test_command_cancels_revert(self):
+        self.post({"state": True, "pulse": 1})
+        with mock.patch("api.registry.scheduler.cancel") as cancel:
+            self.post({"state": True})
+        cancel.assert_called_once_with(self.KEY)
+        # ожидавший возврат забыт: следующий импульс вернёт к явной команде
+        self.post({"state": False, "pulse": 1})
+        self.fire()
+        self.assertTrue(self.state())
+
+    def test_batch(self):
+        # пачка обновляет память и планирует возврат в on_commit
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(
+                [{"house": 1, "kind": "door", "entrance_no": 1, "state": True, "pulse": 1}], "/api/devices/batch/"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.schedule.call_args.args[0], 1.0)
+        self.fire()
+        self.assertFalse(self.state())
+
+
+class SchedulerTests(SimpleTestCase):
+    def run_until(self, scheduler, delay):
+        done = threading.Event()
+        scheduler.schedule(delay, "done", done.set)
+        self.assertTrue(done.wait(5))
+
+    def test_runs(self):
+        scheduler, calls = Scheduler(), []
+        scheduler.schedule(0.01, "a", calls.append, 1)
+        self.run_until(scheduler, 0.05)
+        self.assertEqual(calls, [1])
+        self.assertEqual(scheduler.pending(), 0)
+
+    def test_same_key_replaces(self):
+        scheduler, calls = Scheduler(), []
+        scheduler.schedule(0.01, "a", calls.append, 1)
+        scheduler.schedule(0.02, "a", calls.append, 2)
+        self.run_until(scheduler, 0.05)
+        self.assertEqual(calls, [2])
+
+    def test_cancel(self):
+        scheduler, calls = Scheduler(), []
+        scheduler.schedule(0.01, "a", calls.append, 1)
+        self.assertTrue(scheduler.cancel("a"))
+        self.assertFalse(scheduler.cancel("a"))
+        self.run_until(scheduler, 0.05)
+        self.assertEqual(calls, [])
+
+
+class LoginThrottleTests(TestCase):
+    """Ограничение попыток входа: окна по IP и по логину, Retry-After, ключ по IP."""
+
+    @classmethod
+    def setUpTestData(cls):
+        SimpleUser.objects.create(login="1-1", password="1", name="Жилец")
+
+    def setUp(self):
+        login_ip_limiter.reset()
+        login_name_limiter.reset()
+        self.addCleanup(login_ip_limiter.reset)
+        self.addCleanup(login_name_limiter.reset)
+
+    def login(self, login, password="x", **headers):
+        return self.client.post(
+            "/api/auth/login/", {"login": login, "password": password}, content_type="application/json", **headers
+        )
+
+    def assertWindow(self, name):
+        limit, window = settings.LOGIN_THROTTLE[name]
+        limiter = SlidingWindowLimiter(limit, window, max_keys=10)
+        for second in range(limit):
+            self.assertEqual(limiter.hit("k", now=100 + second), 0)
+        # первая попытка выходит из окна через window секунд после неё
+        self.assertEqual(limiter.hit("k", now=100 + limit), window - limit)
+        self.assertEqual(limiter.hit("other", now=100 + limit), 0)
+        self.assertEqual(limiter.hit("k", now=100 + window + 0.5), 0)
+        self.assertEqual(limiter.stats()["rejected"], 1)
+
+    def test_ip_window(self):
+        self.assertWindow("IP")
+
+    def test_login_window(self):
+        self.assertWindow("LOGIN")
+
+    def test_login_limit(self):
+        limit = settings.LOGIN_THROTTLE["LOGIN"][0]
+        for _ in range(limit):
+            self.assertEqual(self.login("1-1").status_code, 401)
+        response = self.login("1-1", password="1")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        # окно — на логин: другой логин с того же IP проходит
+        self.assertEqual(self.login("2-2").status_code, 401)
+
+    def test_ip_limit_ignores_forwarded_for(self):
+        # без NUM_PROXIES подставной X-Forwarded-For не меняет ключ
+        limit = settings.LOGIN_THROTTLE["IP"][0]
+        for attempt in range(limit):
+            response = self.login(f"user-{attempt}", HTTP_X_FORWARDED_FOR=f"10.0.0.{attempt}")
+            self.assertEqual(response.status_code, 401)
+        response = self.login("1-1", password="1", HTTP_X_FORWARDED_FOR="10.0.1.1")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+class DeviceStreamTests(TransactionTestCase):
+    """
+    SSE: подписчик получает смену состояния, пришедшую POST-ом.
+
+    Registry читает БД из потоков sync_to_async — данным нужен commit,
+    иначе общий in-memory SQLite отвечает «table is locked».
+    """
+
+    URL = "/api/houses/1/entrances/1/door/"
+
+    def setUp(self):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=1)
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    async def test_subscriber_receives_transition(self):
+        response = await self.async_client.get(self.URL + "stream/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        try:
+            first = await asyncio.wait_for(anext(events), 5)
+            self.assertIn(b'"state": false', first)
+            await self.async_client.post(self.URL, {"state": True}, content_type="application/json")
+            event = await asyncio.wait_for(anext(events), 5)
+        finally:
+            await events.aclose()
+        self.assertIn(b"event: state", event)
+        self.assertIn(b'"state": true', event)
+
+    @override_settings(PROCESS_CACHE_CHECK_INTERVAL=0.05, DEVICE_STREAM_HEARTBEAT=30)
+    async def test_other_process_change(self):
+        # qs.update мимо registry — как POST, обработанный другим воркером
+        response = await self.async_client.get(self.URL + "stream/")
+        events = aiter(response.streaming_content)
+        try:
+            await asyncio.wait_for(anext(events), 5)
+            await Device.objects.filter(kind="door").aupdate(state=True, updated_at=timezone.now())
+            event = await asyncio.wait_for(anext(events), 5)
+        finally:
+            await events.aclose()
+        self.assertIn(b'"state": true', event)
+
+    def test_wsgi_not_implemented(self):
+        response = self.client.get(self.URL + "stream/")
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("poll", response.json()["detail"])
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLS)
+class AsyncViewTests(TransactionTestCase):
+    """
+    Async-версии логина и команд устройств. Registry и ORM работают в потоках
+    sync_to_async — как и для SSE, данным нужен commit.
+    """
+
+    URL = "/api/houses/1/entrances/1/door/"
+
+    def setUp(self):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=1)
+        SimpleUser.objects.create(login="1-1", password="1", name="Жилец")
+        registry.invalidate()
+        login_ip_limiter.reset()
+        login_name_limiter.reset()
+        self.addCleanup(login_ip_limiter.reset)
+        self.addCleanup(login_name_limiter.reset)
+
+    def tearDown(self):
+        registry._cancel_revert((1, "door", 1))
+        journal.flush()
+
+    def post(self, url, data):
+        return self.async_client.post(url, data, content_type="application/json")
+
+    async def test_login(self):
+        response = await self.post("/api/auth/login/", {"login": "1-1", "password": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["login"], "1-1")
+        self.assertIn("access", response.json())
+
+        self.assertEqual((await self.post("/api/auth/login/", {"login": "1-1", "password": "x"})).status_code, 401)
+        limit = settings.LOGIN_THROTTLE["LOGIN"][0]
+        for _ in range(limit):
+            response = await self.post("/api/auth/login/", {"login": "1-1", "password": "x"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    async def test_commands(self):
+        self.assertIs((await self.post(self.URL, {"state": True})).json(), True)
+        self.assertIs((await self.async_client.get(self.URL)).json(), True)
+        self.assertIs((await self.post("/api/houses/1/parking/", {"state": True})).json(), True)
+        self.assertIs((await self.async_client.get("/api/parking/")).json(), True)
+
+    @override_settings(PROCESS_CACHE_CHECK_INTERVAL=1e-6)
+    async def test_pulse(self):
+        # каждый запрос проверяет ChangeProbe — запрос к БД не должен попасть в event loop
+        response = await self.post(self.URL, {"state": True, "pulse": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.json(), True)
+        self.assertIs(registry._reverts[(1, "door", 1)], False)
+
+    async def test_errors(self):
+        response = await self.post("/api/houses/9/entrances/1/door/", {"state": True})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("detail", response.json())
+        response = await self.post(self.URL, {"state": True, "pulse": "soon"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pulse", response.json())
+        response = await self.async_client.post(self.URL, "{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = await self.post("/api/houses/1/entrances/1/parking/", {"state": True, "pulse": 2})
+        self.assertEqual(response.status_code, 404)
+
+
+class DefaultHouseTests(TestCase):
+    """Маршруты без номера дома и устройства без дома — это дом DEVICE_DEFAULT_HOUSE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.house = House.objects.create(number=settings.DEVICE_DEFAULT_HOUSE)
+        cls.other = House.objects.create(number=settings.DEVICE_DEFAULT_HOUSE + 1)
+        Entrance.objects.create(house=cls.house, number=2)
+
+    def setUp(self):
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    def migration(self, name):
+        return import_module(f"api.migrations.{name}")
+
+    def test_legacy_route_is_house_route(self):
+        self.client.post("/api/entrances/2/door/", {"state": True}, content_type="application/json")
+        self.assertIs(self.client.get(f"/api/houses/{self.house.number}/entrances/2/door/").json(), True)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/devices/batch/", [{"kind": "kalitka1", "state": True}], content_type="application/json"
+            )
+        self.assertEqual(response.json()[0]["house"], self.house.number)
+        self.assertIs(self.client.get("/api/kalitka1/").json(), True)
+        self.assertFalse(Device.objects.filter(house__isnull=True).exists())
+
+    def test_migration_attaches_legacy_devices(self):
+        legacy = Device.objects.create(kind="door", entrance_no=2, state=True)
+        merged = Device.objects.create(kind="kalitka1")
+        target = Device.objects.create(house=self.house, kind="kalitka1")
+        DeviceEvent.objects.create(device=merged, state=True, source=1)
+        Device.objects.filter(pk=merged.pk).update(state=True, updated_at=timezone.now() + timedelta(minutes=1))
+
+        self.migration("0013_device_default_house").attach_to_default_house(django_apps, None)
+
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.house, self.house)
+        self.assertFalse(Device.objects.filter(pk=merged.pk).exists())
+        target.refresh_from_db()
+        self.assertTrue(target.state)
+        self.assertEqual(target.events.count(), 1)
+
+    def test_duplicates_keep_events(self):
+        # 0012 сравнивал устройства без дома: (kind, entrance_no)
+        first = Device.objects.create(house=self.house, kind="door", entrance_no=2)
+        duplicate = Device.objects.create(house=self.other, kind="door", entrance_no=2)
+        DeviceEvent.objects.create(device=duplicate, state=True, source=1)
+
+        self.migration("0012_device_house").drop_duplicate_devices(django_apps, None)
+
+        self.assertFalse(Device.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(first.events.count(), 1)
+
+
+class JournalActorTests(TestCase):
+    """Кто поменял устройство: жилец по токену, сотрудник в админке, IP."""
+
+    URL = "/api/houses/1/entrances/1/door/"
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=1)
+        cls.resident = SimpleUser.objects.create(login="1-1", password="1", name="Жилец")
+        cls.superuser = User.objects.create_superuser("boss", "boss@example.com", "pw")
+
+    def setUp(self):
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    def actors(self):
+        journal.flush()
+        return list(DeviceEvent.objects.order_by("id").values_list("actor", flat=True))
+
+    def test_api(self):
+        self.client.post(self.URL, {"state": True}, content_type="application/json")
+        self.client.post(
+            self.URL, {"state": False}, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {issue_token(self.resident)[0]}",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/devices/batch/", [{"house": 1, "kind": "door", "entrance_no": 1, "state": True}],
+                content_type="application/json", HTTP_AUTHORIZATION="Bearer not-a-token",
+            )
+        self.assertEqual(self.actors(), ["127.0.0.1", f"user:{self.resident.pk}@127.0.0.1", "127.0.0.1"])
+
+    def test_admin_action(self):
+        device = Device.objects.create(house=House.objects.get(), kind="door", entrance_no=1)
+        self.client.force_login(self.superuser)
+        self.client.post(
+            "/admin/api/device/", {"action": "make_on", "_selected_action": [device.pk]}
+        )
+        self.assertEqual(self.actors(), ["admin:boss@127.0.0.1"])
+
+    def test_threaded_writer_keeps_actor(self):
+        with self.settings(DB_SERIAL_WRITER=True), acting_as("user:7@10.0.0.1"):
+            self.assertEqual(SerialWriter().call(current_actor.get), "user:7@10.0.0.1")
+
+
+class JournalFlushTests(TestCase):
+    """Несостоявшаяся запись журнала не теряет пачку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.device = Device.objects.create(kind="parking")
+
+    def setUp(self):
+        # свой журнал: фоновый сброс общего не вмешивается в подмену bulk_create
+        self.journal = EventJournal()
+        self.bulk_create = DeviceEvent.objects.bulk_create
+
+    def fail_once(self, exc):
+        calls = []
+
+        def bulk_create(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise exc
+            return self.bulk_create(*args, **kwargs)
+
+        return mock.patch.object(DeviceEvent.objects, "bulk_create", side_effect=bulk_create)
+
+    def test_no_thread_without_interval(self):
+        # интервал 0 (setUpModule): полную пачку пишет сама record()
+        with self.settings(DEVICE_JOURNAL_BATCH_SIZE=2):
+            self.journal.record(self.device.pk, True, SOURCE_API)
+            self.assertIsNone(self.journal._thread)
+            self.assertEqual(self.journal.pending(), 1)
+            self.journal.record(self.device.pk, False, SOURCE_API)
+        self.assertEqual((self.journal.pending(), self.device.events.count()), (0, 2))
+
+    def test_failed_batch_is_requeued(self):
+        self.journal.record(self.device.pk, True, SOURCE_API)
+        with self.fail_once(OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                self.journal.flush()
+            self.journal.record(self.device.pk, False, SOURCE_API)
+            self.assertEqual(self.journal.pending(), 2)
+            self.assertEqual(self.journal.flush(), 2)
+        # порядок событий сохранён
+        self.assertEqual(list(self.device.events.order_by("id").values_list("state", flat=True)), [True, False])
+
+    def test_deleted_device_events_dropped(self):
+        gone = Device.objects.create(kind="kalitka1")
+        self.journal.record(gone.pk, True, SOURCE_API)
+        self.journal.record(self.device.pk, True, SOURCE_API)
+        gone.delete()
+        with self.fail_once(IntegrityError("FOREIGN KEY constraint failed")):
+            self.assertEqual(self.journal.flush(), 1)
+        self.assertEqual((self.journal.pending(), self.journal.dropped), (0, 1))
+        self.assertEqual(self.device.events.count(), 1)
+
+    @override_settings(DEVICE_JOURNAL_MAX_PENDING=2)
+    def test_buffer_is_bounded(self):
+        for state in (True, False, True):
+            self.journal.record(self.device.pk, state, SOURCE_API)
+        with mock.patch.object(DeviceEvent.objects, "bulk_create", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.journal.flush()
+        self.assertEqual((self.journal.pending(), self.journal.dropped), (2, 1))
+        self.assertEqual(self.journal.flush(), 2)
+        self.assertEqual(list(self.device.events.order_by("id").values_list("state", flat=True)), [False, True])
+
+
+class DeviceEventListTests(TestCase):
+    """Журнал устройств по API: только администрации, параметры проверяются, виден actor."""
+
+    URL = "/api/devices/events/"
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        device = Device.objects.create(house=house, kind="door", entrance_no=1)
+        DeviceEvent.objects.create(device=device, state=True, source=SOURCE_API, actor="user:7@10.0.0.1")
+        cls.resident = SimpleUser.objects.create(login="1-1", password="1", name="Жилец")
+        cls.staff = SimpleUser.objects.create(login="admin", password="x", name="Админ", role="admin")
+
+    def get(self, url, user=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {issue_token(user)[0]}"} if user else {}
+        return self.client.get(url, **headers)
+
+    def test_access(self):
+        self.assertEqual(self.get(self.URL).status_code, 401)
+        self.assertEqual(self.get(self.URL, self.resident).status_code, 403)
+        response = self.get(self.URL, self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["actor"], "user:7@10.0.0.1")
+
+    def test_invalid_params(self):
+        for query, param in (
+            ("house=x", "house"),
+            ("entrance_no=abc", "entrance_no"),
+            ("since=2026-13-40T00:00", "since"),
+            ("until=yesterday", "until"),
+        ):
+            with self.subTest(query=query):
+                response = self.get(f"{self.URL}?{query}", self.staff)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.json())
+        self.assertEqual(len(self.get(f"{self.URL}?house=1&entrance_no=1", self.staff).json()["results"]), 1)
+
+
+@override_settings(PROCESS_CACHE_CHECK_INTERVAL=1e-6)
+class OtherProcessChangesTests(TestCase):
+    """Кэши процесса видят правки мимо сигналов (другой процесс — здесь qs.update)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.house = House.objects.create(number=1)
+        entrance = Entrance.objects.create(house=cls.house, number=1)
+        Apartment.objects.create(entrance=entrance, number="12")
+        user = SimpleUser.objects.create(login="1-1-12", password="1", name="Жилец")
+        ResidentProfile.objects.create(user=user, apartment_no="12")
+        cls.device = Device.objects.create(house=cls.house, kind="door", entrance_no=1)
+
+    def setUp(self):
+        registry.invalidate()
+        directory.invalidate()
+        search_index.invalidate()
+
+    def test_registry(self):
+        self.assertFalse(registry.get("door", 1, 1))
+        Device.objects.filter(pk=self.device.pk).update(state=True, updated_at=timezone.now())
+        self.assertTrue(registry.get("door", 1, 1))
+
+    def test_snapshot_etag(self):
+        response = self.client.get("/api/devices/")
+        etag, version = response["ETag"], response.json()["version"]
+        Device.objects.filter(pk=self.device.pk).update(state=True, updated_at=timezone.now())
+        for params in ({"HTTP_IF_NONE_MATCH": etag}, {"QUERY_STRING": f"version={version}"}):
+            response = self.client.get("/api/devices/", **params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIs(response.json()["devices"]["h1:door:1"], True)
+
+    def test_directory(self):
+        version = directory.get()[0]
+        House.objects.filter(pk=self.house.pk).update(number=7)
+        new_version, content = directory.get()
+        self.assertGreater(new_version, version)
+        self.assertEqual(json.loads(content)[0]["number"], 7)
+
+    def test_directory_etag(self):
+        etag = self.client.get("/api/directory/")["ETag"]
+        Apartment.objects.bulk_create([Apartment(entrance=Entrance.objects.get(), number="13")])
+        response = self.client.get("/api/directory/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        numbers = [item["number"] for item in json.loads(response.content)[0]["entrances"][0]["apartments"]]
+        self.assertEqual(numbers, ["12", "13"])
+
+    def test_search(self):
+        self.assertEqual(search_index.search("555", RESIDENT), [])
+        ResidentProfile.objects.update(phone="+7 900 555-00-11", updated_at=timezone.now())
+        self.assertEqual([item["login"] for item in search_index.search("555", RESIDENT)], ["1-1-12"])
+
+    def test_own_changes_do_not_reload(self):
+        # после своей правки — только запросы отпечатка, без перечитывания таблиц
+        registry.get("door", 1, 1)
+        self.client.post("/api/houses/1/entrances/1/door/", {"state": True}, content_type="application/json")
+        with self.assertNumQueries(1):
+            self.assertTrue(registry.get("door", 1, 1))
+
+        search_index.search("12")
+        profile = ResidentProfile.objects.get()
+        profile.phone = "+7 900 555-00-11"
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        with self.assertNumQueries(5):
+            self.assertEqual([item["login"] for item in search_index.search("555", RESIDENT)], ["1-1-12"])
+        journal.flush()
+
+    @override_settings(PROCESS_CACHE_CHECK_INTERVAL=0)
+    def test_disabled(self):
+        registry.get("door", 1, 1)
+        with self.assertNumQueries(0):
+            registry.get("door", 1, 1)
+
+
+@override_settings(PROCESS_CACHE_CHECK_INTERVAL=0, METRICS_TOKEN="")
+class MetricsTests(TestCase):
+    """/api/metrics: метки по шаблону маршрута, запросы к БД, гистограммы, токен."""
+
+    DEVICE_ROUTE = "/api/houses/<int:house>/entrances/<int:no>/<slug:kind>/"
+
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        Entrance.objects.create(house=house, number=1)
+
+    def setUp(self):
+        registry.invalidate()
+        for no in (1, 2):
+            registry.get("door", no, 1)
+        request_metrics.reset()
+        self.addCleanup(request_metrics.reset)
+
+    def samples(self, **headers):
+        response = self.client.get("/api/metrics", **headers)
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_routes(self):
+        self.client.get("/api/houses/1/entrances/1/door/")
+        self.client.get("/api/houses/1/entrances/2/door/")
+        self.client.get("/api/houses/")
+        self.assertEqual(self.client.get("/nowhere/").status_code, 404)
+        samples = self.samples()
+
+        def sample(name, route, **labels):
+            extra = "".join(f',{key}="{value}"' for key, value in labels.items())
+            return samples[f'{name}{{method="GET",route="{route}"{extra}}}']
+
+        # номера дома и подъезда — в шаблоне, одна метка на оба запроса
+        self.assertEqual(sample("aristokrat_http_requests_total", self.DEVICE_ROUTE, status=200), 2)
+        self.assertEqual(sample("aristokrat_http_requests_total", UNMATCHED, status=404), 1)
+        self.assertEqual(sample("aristokrat_http_db_queries_total", "/api/houses/"), 1)
+        self.assertEqual(sample("aristokrat_http_db_queries_total", self.DEVICE_ROUTE), 0)
+
+        buckets = [
+            sample("aristokrat_http_request_duration_seconds_bucket", self.DEVICE_ROUTE, le=bound)
+            for bound in (*LATENCY_BUCKETS, "+Inf")
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], sample("aristokrat_http_request_duration_seconds_count", self.DEVICE_ROUTE))
+        self.assertEqual(buckets[-1], 2)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token(self):
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Bearer")
+        self.assertEqual(self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.samples(HTTP_AUTHORIZATION="Bearer s3cret")["aristokrat_registry_devices"], 2)
+
+
+class ReplicaWriteView(View):
+    """GET с записью посреди запроса: до неё чтения с реплики, после — с default."""
+    replica_reads = True
+
+    def get(self, request):
+        before = list(House.objects.values_list("number", flat=True))
+        House.objects.create(number=5)
+        after = list(House.objects.order_by("number").values_list("number", flat=True))
+        return JsonResponse({"before": before, "after": after})
+
+
+REPLICA = "replica1"
+REPLICA_URLS = types.ModuleType("api_replica_urls")
+REPLICA_URLS.urlpatterns = build_urlpatterns() + [path("test/replica-write/", ReplicaWriteView.as_view())]
+
+
+@override_settings(
+    ROOT_URLCONF=REPLICA_URLS,
+    DATABASE_REPLICAS=[REPLICA],
+    DATABASE_ROUTERS=["api.routers.ReplicaRouter"],
+    MIDDLEWARE=[
+        *settings.MIDDLEWARE[:settings.MIDDLEWARE.index("django.middleware.common.CommonMiddleware")],
+        "api.routers.ReplicaMiddleware",
+        *settings.MIDDLEWARE[settings.MIDDLEWARE.index("django.middleware.common.CommonMiddleware"):],
+    ],
+    REPLICA_MAX_LAG=5,
+)
+class ReplicaRoutingTests(TestCase):
+    """
+    Чтения на реплику (api/routers.py). Реплика — копия тестовой БД в файле,
+    как после manage.py sync_replicas, но с другим номером дома: по ответу
+    видно, откуда читали.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        cls.replica_name = os.path.join(cls.replica_dir.name, "replica.sqlite3")
+        super().setUpClass()
+        # алиас — только на время класса: в settings.DATABASES его нет, поэтому
+        # и в databases его не объявить — раннер создавал бы для него тестовую БД
+        connections.settings[REPLICA] = {**connections.settings["default"], "NAME": cls.replica_name}
+        cls.databases = cls.databases | {REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        # до отката транзакций класса: они открыты только на default
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.databases = cls.databases - {REPLICA}
+        super().tearDownClass()
+        cls.replica_dir.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        Entrance.objects.create(house=House.objects.create(number=1), number=1)
+        cls.superuser = User.objects.create_superuser("boss", "boss@example.com", "pw")
+        with closing(sqlite3.connect(cls.replica_name)) as copy:
+            copy.executescript("\n".join(connection.connection.iterdump()))
+            copy.execute("UPDATE api_house SET number = 101")
+            copy.commit()
+
+    def setUp(self):
+        replica_lag.reset()
+        self.addCleanup(replica_lag.reset)
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    def houses(self):
+        return [item["number"] for item in self.client.get("/api/houses/").json()]
+
+    def test_marked_get_reads_replica(self):
+        self.assertEqual(self.houses(), [101])
+
+    def test_write_pins_reads_to_default(self):
+        response = self.client.get("/test/replica-write/").json()
+        self.assertEqual(response, {"before": [101], "after": [1, 5]})
+        # закрепление — до конца запроса, следующий снова читает реплику
+        self.assertEqual(self.houses(), [101])
+
+    def test_lagging_replica_skipped(self):
+        with mock.patch.object(ReplicaLag, "measure", return_value=60.0):
+            self.assertEqual(self.houses(), [1])
+            replica_lag.reset()
+            with self.settings(REPLICA_MAX_LAG=120):
+                self.assertEqual(self.houses(), [101])
+
+    def test_posts_and_unmarked_views_use_default(self):
+        self.client.force_login(self.superuser)
+        with CaptureQueriesContext(connections[REPLICA]) as ctx:
+            response = self.client.post(
+                "/api/houses/1/entrances/1/door/", {"state": True}, content_type="application/json"
+            )
+            self.assertIs(response.json(), True)
+            self.assertEqual(self.client.get("/admin/api/house/").status_code, 200)
+        self.assertEqual(len(ctx), 0, captured_sql(ctx))
+
+    def test_sessions_read_from_default(self):
+        # сессии входа в копии реплики нет — с неё пользователь стал бы анонимом
+        self.client.force_login(self.superuser)
+        with CaptureQueriesContext(connections[REPLICA]) as ctx:
+            self.assertEqual(self.houses(), [101])
+        self.assertNotIn("django_session", captured_sql(ctx))
+
+
+@override_settings(PROCESS_CACHE_CHECK_INTERVAL=0)
+class DeviceBehaviourTests(TestCase):
+    """Long-poll, атомарность пачки, версии снимка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in (1, 2):
+            house = House.objects.create(number=number)
+            Device.objects.create(house=house, kind="door", entrance_no=1)
+
+    def setUp(self):
+        registry.invalidate()
+
+    def tearDown(self):
+        journal.flush()
+
+    def test_unknown_or_misplaced_kind(self):
+        # как device_entrance_rules: до писателя, без IntegrityError
+        for method, url in (
+            ("post", "/api/houses/1/foo/"),
+            ("post", "/api/houses/1/entrances/1/parking/"),
+            ("post", "/api/houses/1/door/"),
+            ("get", "/api/houses/1/entrances/1/kalitka1/"),
+            ("get", "/api/houses/1/foo/poll/?timeout=0"),
+        ):
+            with self.subTest(url=url):
+                response = getattr(self.client, method)(url, {"state": True}, content_type="application/json")
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(Device.objects.count(), 2)
+
+    def test_long_poll_wakes_on_change(self):
+        _, version = registry.get_versioned("door", 1, 1)
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(registry.wait("door", 1, version, 5, 1)))
+        started = time.monotonic()
+        waiter.start()
+        time.sleep(0.05)
+        registry.set("door", 1, True, house=1)
+        waiter.join(5)
+        state, new_version = result[0]
+        self.assertTrue(state)
+        self.assertGreater(new_version, version)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_long_poll_timeout(self):
+        state, version = registry.get_versioned("door", 1, 1)
+        response = self.client.get(f"/api/houses/1/entrances/1/door/poll/?since={version}&timeout=0.05")
+        self.assertEqual(response.json(), {"state": state, "version": version})
+
+    def test_batch_is_atomic(self):
+        # неизвестный дом во второй команде — первая тоже не применяется
+        response = self.client.post("/api/devices/batch/", [
+            {"house": 1, "kind": "door", "entrance_no": 1, "state": True},
+            {"house": 9, "kind": "door", "entrance_no": 1, "state": True},
+        ], content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(registry.get("door", 1, 1))
+        self.assertFalse(Device.objects.get(house__number=1).state)
+        self.assertFalse(Device.objects.filter(house__number=9).exists())
+
+    def test_snapshot_versions(self):
+        response = self.client.get("/api/devices/")
+        version, etag = response.json()["version"], response["ETag"]
+        self.assertEqual(response.json()["devices"], {"h1:door:1": False, "h2:door:1": False})
+        self.assertEqual(self.client.get("/api/devices/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(f"/api/devices/?version={version}").status_code, 304)
+
+        registry.set("door", 1, True, house=2)
+        response = self.client.get("/api/devices/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json()["version"], version)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertTrue(response.json()["devices"]["h2:door:1"])
+
+
+class ApartmentListTests(TestCase):
+    """Список квартир: фильтры, сортировка, keyset-курсор."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for house_no, entrances, per_entrance in ((1, 3, 40), (2, 1, 5)):
+            house = House.objects.create(number=house_no)
+            for entrance_no in range(1, entrances + 1):
+                entrance = Entrance.objects.create(house=house, number=entrance_no)
+                Apartment.objects.bulk_create([
+                    Apartment(entrance=entrance, number=str(no), is_blocked=no % 10 == 0)
+                    for no in range(1, per_entrance + 1)
+                ])
+
+    def results(self, query):
+        response = self.client.get(f"/api/apartments/?{query}")
+        self.assertEqual(response.status_code, 200, query)
+        return response.json()["results"]
+
+    def test_cursor_pages_are_unique_and_complete(self):
+        ids, url = [], "/api/apartments/?cursor="
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(item["id"] for item in page["results"])
+            url = page["next"]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), sorted(Apartment.objects.values_list("id", flat=True)))
+
+    def test_filters(self):
+        rows = self.results("house=1&entrance=2")
+        self.assertEqual({(row["house"], row["entrance"]) for row in rows}, {(1, 2)})
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(len(self.results("is_blocked=true")), 12)
+        self.assertTrue(all(row["number"].startswith("1") for row in self.results("house=2&number_prefix=1")))
+        rows = self.results("number_min=10&number_max=12")
+        self.assertEqual(sorted({row["number"] for row in rows}), ["10", "11", "12"])
+        self.assertEqual(len(rows), 9)
+
+    def test_ordering(self):
+        rows = self.results("house=1&entrance=1&ordering=-number")
+        self.assertEqual([row["number"] for row in rows[:3]], ["40", "39", "38"])
+        rows = self.results("ordering=-house,entrance")
+        self.assertEqual((rows[0]["house"], rows[-1]["house"]), (2, 1))
+
+    def test_cursor_rejects_ordering(self):
+        response = self.client.get("/api/apartments/?cursor=&ordering=-number")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ordering", response.json())
+        # без курсора сортировка работает
+        self.assertEqual(self.results("ordering=-number&house=2")[0]["number"], "5")
+
+    def test_invalid_params(self):
+        for query in ("house=x", "is_blocked=maybe", "ordering=owner_name"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/api/apartments/?{query}").status_code, 400)
+
+
+class ImportResidentsTests(TestCase):
+    HEADER = "login,password,name,phone,house,entrance,apartment\n"
+
+    def run_import(self, lines, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "residents.csv")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(lines)
+            out, err = StringIO(), StringIO()
+            call_command("import_residents", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_errors_are_reported_per_line(self):
+        out, err = self.run_import(self.HEADER + "\n".join([
+            "1-1-5,pw,Иванов,+7 900 123-45-67,1,1,5",
+            "1-1-6,,Без пароля,,1,1,6",
+            "1-1-7,pw,Телефон,12,1,1,7",
+            "1-1-8,pw,Дом,,x,1,8",
+            "1-1-9,pw,Квартира без дома,,,,9",
+            "1-2-1,pw,Петров,,1,2,1",
+            "1-1-5,pw,Иванова,+7 900 123-45-67,1,1,5",
+        ]) + "\n")
+        for line_no in (3, 4, 5, 6):
+            self.assertIn(f"строка {line_no}:", err)
+        self.assertIn("строка 8: логин 1-1-5 повторяется", err)
+        self.assertIn("Импортировано строк: 2, ошибок: 4", out)
+
+        self.assertEqual(set(SimpleUser.objects.values_list("login", flat=True)), {"1-1-5", "1-2-1"})
+        user = SimpleUser.objects.select_related("profile").get(login="1-1-5")
+        self.assertEqual((user.name, user.profile.phone), ("Иванова", "+79001234567"))
+        self.assertEqual(Apartment.objects.get(entrance__number=1).owner_name, "Иванова")
+
+    def test_dry_run(self):
+        out, _ = self.run_import(self.HEADER + "1-1-5,pw,Иванов,,1,1,5\n", "--dry-run")
+        self.assertIn("Проверено строк: 1", out)
+        self.assertFalse(SimpleUser.objects.exists())
+        self.assertFalse(House.objects.exists())
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(CommandError, "password"):
+            self.run_import("login,name\n1-1-5,Иванов\n")
+
+
+class ExportContentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        house = House.objects.create(number=1)
+        entrance = Entrance.objects.create(house=house, number=2)
+        Apartment.objects.create(entrance=entrance, number="7", owner_name="Иванов")
+        cls.admin = SimpleUser.objects.create(login="admin", password="secret", name="Админ", role="admin")
+        resident = SimpleUser.objects.create(login="1-2-7", password="secret", name="Иванов")
+        ResidentProfile.objects.create(user=resident, house_number=1, entrance_no=2, apartment_no="7")
+        Device.objects.create(house=house, kind="door", entrance_no=2, state=True)
+
+    def export(self, name):
+        response = self.client.get(
+            f"/api/export/{name}", HTTP_AUTHORIZATION=f"Bearer {issue_token(self.admin)[0]}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(name, response["Content-Disposition"])
+        return b"".join(response.streaming_content).decode()
+
+    def test_residents_csv(self):
+        content = self.export("residents.csv")
+        self.assertTrue(content.startswith("﻿"))
+        rows = list(csv.DictReader(StringIO(content.lstrip("﻿"))))
+        self.assertNotIn("password", rows[0])
+        self.assertNotIn("secret", content)
+        resident = next(row for row in rows if row["login"] == "1-2-7")
+        self.assertEqual(
+            (resident["name"], resident["house_number"], resident["entrance_no"], resident["apartment_no"]),
+            ("Иванов", "1", "2", "7"),
+        )
+        self.assertEqual(rows[0]["login"], "admin")
+        self.assertEqual(rows[0]["apartment_no"], "")
+
+    def test_devices_ndjson(self):
+        lines = self.export("devices.ndjson").splitlines()
+        self.assertEqual(len(lines), 1)
+        device = json.loads(lines[0])
+        self.assertEqual(
+            {key: device[key] for key in ("house", "kind", "entrance_no", "state")},
+            {"house": 1, "kind": "door", "entrance_no": 2, "state": True},
+        )
+
+    def test_unknown_dataset(self):
+        response = self.client.get(
+            "/api/export/passwords.csv", HTTP_AUTHORIZATION=f"Bearer {issue_token(self.admin)[0]}"
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+class SlidingWindowLimiter:
+    """
+    Скользящее окно в памяти процесса: не больше limit попыток за window секунд на ключ.
+
+    Ключи хранятся в порядке последнего обращения: простаивающие дольше окна
+    и самые старые сверх max_keys вытесняются с головы, так что память ограничена
+    max_keys * limit отметок времени.
+    """
+
+    def __init__(self, limit, window, max_keys):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._hits = OrderedDict()  # key -> deque[monotonic]
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def hit(self, key, now=None):
+        """Учесть попытку. 0 — пропустить, иначе через сколько секунд можно повторить."""
+        now = time.monotonic() if now is None else now
+        edge = now - self.window
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.limit)
+            else:
+                self._hits.move_to_end(key)
+                while hits and hits[0] <= edge:
+                    hits.popleft()
+
+            if len(hits) >= self.limit:
+                self.rejected += 1
+                return hits[0] - edge
+
+            hits.append(now)
+            self.allowed += 1
+            self._evict(edge)
+            return 0
+
+    def _evict(self, edge):
+        # под замком; с головы — ключи, к которым дольше всего не обращались
+        while self._hits:
+            key, hits = next(iter(self._hits.items()))
+            if len(self._hits) <= self.max_keys and hits and hits[-1] > edge:
+                break
+            del self._hits[key]
+            self.evicted += 1
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._hits),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
+
+
+def _limiter(name):
+    limit, window = settings.LOGIN_THROTTLE[name]
+    return SlidingWindowLimiter(limit, window, settings.LOGIN_THROTTLE["MAX_KEYS"])
+
+
+login_ip_limiter = _limiter("IP")
+login_name_limiter = _limiter("LOGIN")
+
+
+def login_retry_after(ident, login):
+    """Секунды до следующей попытки входа (0 — можно): сначала по IP, потом по логину."""
+    retry_after = login_ip_limiter.hit(ident)
+    if not retry_after and login:
+        retry_after = login_name_limiter.hit(str(login).lower())
+    return retry_after
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Ограничение попыток входа по IP и по логину — до запроса к БД.
+
+    IP — get_ident() DRF: за прокси задайте REST_FRAMEWORK["NUM_PROXIES"]
+    (DJANGO_NUM_PROXIES), иначе ключ — REMOTE_ADDR.
+    """
+
+    def allow_request(self, request, view):
+        self.retry_after = login_retry_after(self.get_ident(request), request.data.get("login"))
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
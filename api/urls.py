@@ -1,31 +1,81 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 
 from api.views import (
     LoginView,
+    MeView,
     ApartmentViewSet,
     HouseList,
     EntranceList,
+    SearchView,
+    DirectoryView,
+    ExportView,
+    MetricsView,
     DeviceByEntranceView,
     DeviceGlobalView,
+    DeviceSnapshotView,
+    DeviceBatchView,
+    DeviceEventList,
+    DeviceByEntrancePollView,
+    DeviceGlobalPollView,
+    DeviceByEntranceStreamView,
+    DeviceGlobalStreamView,
+    AsyncLoginView,
+    AsyncDeviceByEntranceView,
+    AsyncDeviceGlobalView,
 )
 
 router = DefaultRouter()
 router.register(r"apartments", ApartmentViewSet, basename="apartments")
 
-urlpatterns = [
-    path("admin/", admin.site.urls),
 
-    # auth (простая, без токенов)
-    path("api/auth/login/", LoginView.as_view()),
+def build_urlpatterns(async_views=settings.ASYNC_VIEWS, default_house=settings.DEVICE_DEFAULT_HOUSE):
+    """
+    Маршруты api; async_views — async-версии логина и команд устройств (под ASGI),
+    default_house — дом маршрутов устройств без номера дома.
+    """
+    login = AsyncLoginView if async_views else LoginView
+    by_entrance = AsyncDeviceByEntranceView if async_views else DeviceByEntranceView
+    by_kind = AsyncDeviceGlobalView if async_views else DeviceGlobalView
+    legacy = {"house": default_house}
+    return [
+        path("admin/", admin.site.urls),
 
-    # data
-    path("api/", include(router.urls)),
-    path("api/houses/", HouseList.as_view()),
-    path("api/entrances/", EntranceList.as_view()),
+        # auth (логин/пароль → короткоживущий Bearer-токен)
+        path("api/auth/login/", login.as_view()),
+        path("api/auth/me/", MeView.as_view()),
 
-    # devices
-    path("api/entrances/<int:no>/<slug:kind>/", DeviceByEntranceView.as_view()),
-    path("api/<slug:kind>/", DeviceGlobalView.as_view()),
-]
+        # data
+        path("api/", include(router.urls)),
+        path("api/houses/", HouseList.as_view()),
+        path("api/entrances/", EntranceList.as_view()),
+        path("api/search/", SearchView.as_view()),
+        path("api/directory/", DirectoryView.as_view()),
+        path("api/export/<slug:dataset>.<slug:fmt>", ExportView.as_view()),
+        # Prometheus: без слэша, как принято у скрейперов; со слэшем — не в api/<kind>/
+        re_path(r"^api/metrics/?$", MetricsView.as_view()),
+
+        # devices
+        path("api/devices/", DeviceSnapshotView.as_view()),
+        path("api/devices/batch/", DeviceBatchView.as_view()),
+        path("api/devices/events/", DeviceEventList.as_view()),
+        path("api/houses/<int:house>/entrances/<int:no>/<slug:kind>/", by_entrance.as_view()),
+        path("api/houses/<int:house>/entrances/<int:no>/<slug:kind>/poll/", DeviceByEntrancePollView.as_view()),
+        path("api/houses/<int:house>/entrances/<int:no>/<slug:kind>/stream/", DeviceByEntranceStreamView.as_view()),
+        path("api/houses/<int:house>/<slug:kind>/", by_kind.as_view()),
+        path("api/houses/<int:house>/<slug:kind>/poll/", DeviceGlobalPollView.as_view()),
+        path("api/houses/<int:house>/<slug:kind>/stream/", DeviceGlobalStreamView.as_view()),
+
+        # без номера дома (старые контроллеры) — те же устройства дома default_house
+        path("api/entrances/<int:no>/<slug:kind>/", by_entrance.as_view(), legacy),
+        path("api/entrances/<int:no>/<slug:kind>/poll/", DeviceByEntrancePollView.as_view(), legacy),
+        path("api/entrances/<int:no>/<slug:kind>/stream/", DeviceByEntranceStreamView.as_view(), legacy),
+        path("api/<slug:kind>/", by_kind.as_view(), legacy),
+        path("api/<slug:kind>/poll/", DeviceGlobalPollView.as_view(), legacy),
+        path("api/<slug:kind>/stream/", DeviceGlobalStreamView.as_view(), legacy),
+    ]
+
+
+urlpatterns = build_urlpatterns()
@@ -1,28 +1,56 @@
+import asyncio
+import hmac
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics, viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import PermissionDenied, Throttled, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from .models import (
-    SimpleUser, House, Entrance, Apartment, Device
+    SimpleUser, House, Entrance, Apartment, DeviceEvent
 )
 from .serializers import (
     SimpleUserSerializer,
     HouseSerializer, EntranceSerializer,
-    ApartmentSerializer, ApartmentListSerializer
+    ApartmentSerializer, ApartmentListSerializer,
+    DeviceCommandSerializer, DeviceEventSerializer,
+    pulse_seconds,
 )
+from .authentication import IDENTITY_AUTHENTICATION, issue_token
+from .directory import directory
+from .exports import DATASETS, FORMATS, export_lines
+from .filters import ApartmentFilter, _int_param
+from .journal import acting_as, actor_of
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+from .pagination import KeysetPagination
+from .permissions import IsAdministrator
+from .registry import registry
+from .search import search_index, APARTMENT, RESIDENT
+from .throttling import LoginRateThrottle, login_retry_after
 
 
 # ---------- AUTH ----------
 
 class LoginView(APIView):
+    # просроченный токен в заголовке не должен мешать повторному входу
+    authentication_classes = []
     permission_classes = []
+    throttle_classes = [LoginRateThrottle]
 
     def post(self, request):
         login = request.data.get("login")
         password = request.data.get("password")
 
-        user = SimpleUser.objects.filter(
+        user = SimpleUser.objects.select_related("profile").filter(
             login=login,
             password=password,
             is_active=True
@@ -31,7 +59,46 @@ class LoginView(APIView):
         if not user:
             return Response({"message": "Неверный логин или пароль"}, status=401)
 
-        return Response(SimpleUserSerializer(user).data)
+        token, expires_in = issue_token(user)
+        return Response({
+            **SimpleUserSerializer(user).data,
+            "access": token,
+            "expires_in": expires_in,
+        })
+
+
+class MeView(APIView):
+    """Текущий пользователь по Bearer-токену (из кэша, без запроса к БД)."""
+    authentication_classes = IDENTITY_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(request.user.as_dict())
+
+
+# ---------- LEAN LISTS ----------
+
+class ValuesListMixin:
+    """
+    list() без моделей и сериализатора: строки берутся через values_list()
+    и сразу становятся dict. Ответ совпадает с сериализатором списка.
+
+    list_fields — пары (ключ ответа, lookup ORM). Колонки из list_hidden
+    выбираются после них и в ответ не попадают (нужны, например, курсору).
+    """
+    list_fields = ()
+    list_hidden = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        names = [name for name, _ in self.list_fields]
+        rows = queryset.values_list(*(lookup for _, lookup in self.list_fields), *self.list_hidden)
+
+        page = self.paginate_queryset(rows)
+        data = [dict(zip(names, row)) for row in (rows if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
 
 # ---------- APARTMENTS ----------
@@ -40,10 +107,42 @@ class ApartmentPagination(PageNumberPagination):
     page_size = 50
 
 
-class ApartmentViewSet(viewsets.ModelViewSet):
+class ApartmentCursorPagination(KeysetPagination):
+    page_size = 50
+    key_field = "entrance_id"
+
+    def get_row_key(self, row):
+        # строки из ApartmentViewSet.list(): (id, ..., entrance_id)
+        return row[-1], row[0]
+
+
+class ApartmentViewSet(ValuesListMixin, viewsets.ModelViewSet):
+    # GET-запросы могут читать с реплики (api/routers.py)
+    replica_reads = True
     queryset = Apartment.objects.select_related("entrance", "entrance__house")
     serializer_class = ApartmentSerializer
     pagination_class = ApartmentPagination
+    filter_backends = [ApartmentFilter]
+
+    # то же, что ApartmentListSerializer
+    list_fields = (
+        ("id", "id"),
+        ("house", "entrance__house__number"),
+        ("entrance", "entrance__number"),
+        ("number", "number"),
+        ("is_blocked", "is_blocked"),
+    )
+    list_hidden = ("entrance_id",)
+
+    @property
+    def paginator(self):
+        # ?cursor= включает keyset-пагинацию вместо номеров страниц
+        if not hasattr(self, "_paginator"):
+            if self.request is not None and "cursor" in self.request.query_params:
+                self._paginator = ApartmentCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_serializer_class(self):
         return ApartmentListSerializer if self.action == "list" else ApartmentSerializer
@@ -51,45 +150,428 @@ class ApartmentViewSet(viewsets.ModelViewSet):
 
 # ---------- LISTS ----------
 
-class HouseList(generics.ListAPIView):
+class HouseList(ValuesListMixin, generics.ListAPIView):
+    replica_reads = True
     queryset = House.objects.all().order_by("number")
     serializer_class = HouseSerializer
+    list_fields = (("id", "id"), ("number", "number"))
 
 
-class EntranceList(generics.ListAPIView):
+class EntranceList(ValuesListMixin, generics.ListAPIView):
+    replica_reads = True
     serializer_class = EntranceSerializer
+    list_fields = (("id", "id"), ("number", "number"), ("house", "house"))
 
     def get_queryset(self):
         house = self.request.query_params.get("house")
-        qs = Entrance.objects.select_related("house")
+        # явный порядок: в values_list колонка "house" перекрыла бы Meta.ordering
+        qs = Entrance.objects.order_by("house__number", "number")
         return qs.filter(house__number=house) if house else qs
 
 
+class DirectoryView(APIView):
+    """
+    Весь справочник одним ответом: дома → подъезды → квартиры.
+    Тёплый ответ — готовые байты из кэша; If-None-Match с текущей версией → 304.
+    """
+
+    def get(self, request):
+        # сначала правки других процессов — иначе старый ETag получал бы 304 вечно
+        etag = f'"directory-{directory.refresh()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        version, content = directory.get()
+        return HttpResponse(
+            content, content_type="application/json", headers={"ETag": f'"directory-{version}"'}
+        )
+
+
+# ---------- EXPORT ----------
+
+class ExportView(APIView):
+    """api/export/residents.csv, api/export/devices.ndjson, ... — потоково, без буфера в памяти."""
+    authentication_classes = IDENTITY_AUTHENTICATION
+    permission_classes = [IsAdministrator]
+
+    def get(self, request, dataset, fmt):
+        if dataset not in DATASETS or fmt not in FORMATS:
+            return Response({"message": "Неизвестный набор данных или формат"}, status=404)
+
+        response = StreamingHttpResponse(export_lines(dataset, fmt), content_type=FORMATS[fmt])
+        response["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+        return response
+
+
+# ---------- METRICS ----------
+
+class MetricsView(View):
+    """
+    /api/metrics — текстовый формат Prometheus. Без DRF: скрейпер не проходит
+    аутентификацию пользователей; если задан METRICS_TOKEN — нужен Bearer с ним.
+    """
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if token and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+        return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+# ---------- SEARCH ----------
+
+class SearchView(APIView):
+    """
+    ?q=<строка>[&type=apartment|resident][&limit=20] — поиск по индексу в памяти.
+    Только с входом; жильцы (логин, телефон, номер машины) — только администрации,
+    остальным — квартиры.
+    """
+    authentication_classes = IDENTITY_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        doc_type = request.query_params.get("type") or None
+        if doc_type not in (None, APARTMENT, RESIDENT):
+            raise ValidationError({"type": f"Ожидается {APARTMENT} или {RESIDENT}"})
+        if not IsAdministrator().has_permission(request, self):
+            if doc_type == RESIDENT:
+                raise PermissionDenied("Поиск жильцов доступен только администрации")
+            # и не по телефону / логину жильца: совпадение само выдало бы, чей он
+            doc_type = APARTMENT
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), 100)
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число"})
+
+        return Response(search_index.search(request.query_params.get("q", ""), doc_type, limit))
+
+
 # ---------- DEVICES ----------
 
+def _pulse_seconds(value):
+    try:
+        return pulse_seconds(value)
+    except ValidationError as exc:
+        raise ValidationError({"pulse": exc.detail})
+
+
+def _device_command(request, kind, no, house):
+    data = request.data
+    pulse = _pulse_seconds(data.get("pulse"))
+    with acting_as(actor_of(request)):
+        if pulse:
+            return registry.pulse(kind, no, data.get("state", True), pulse, house=house)
+        return registry.set(kind, no, data.get("state"), house=house)
+
+
 class DeviceByEntranceView(APIView):
+    """/api/entrances/<no>/<kind>/ и /api/houses/<house>/entrances/<no>/<kind>/"""
+    replica_reads = True
     permission_classes = []
 
-    def get(self, request, no, kind):
-        dev, _ = Device.objects.get_or_create(kind=kind, entrance_no=no)
-        return Response(dev.state)
+    def get(self, request, no, kind, house=None):
+        return Response(registry.get(kind, no, house))
 
-    def post(self, request, no, kind):
-        dev, _ = Device.objects.get_or_create(kind=kind, entrance_no=no)
-        dev.state = bool(request.data.get("state"))
-        dev.save()
-        return Response(dev.state)
+    def post(self, request, no, kind, house=None):
+        return Response(_device_command(request, kind, no, house))
 
 
 class DeviceGlobalView(APIView):
+    """/api/<kind>/ и /api/houses/<house>/<kind>/"""
+    replica_reads = True
+    permission_classes = []
+
+    def get(self, request, kind, house=None):
+        return Response(registry.get(kind, None, house))
+
+    def post(self, request, kind, house=None):
+        return Response(_device_command(request, kind, None, house))
+
+
+class DeviceSnapshotView(APIView):
+    """
+    Состояние всех устройств одним ответом.
+    Клиент с актуальной версией (If-None-Match или ?version=) получает 304.
+    """
+    replica_reads = True
+    permission_classes = []
+
+    def get(self, request):
+        # сначала правки других процессов — иначе старый ETag получал бы 304 вечно
+        version = registry.refresh()
+        etag = f'"devices-{version}"'
+        if (
+            request.headers.get("If-None-Match") == etag
+            or request.query_params.get("version") == str(version)
+        ):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        version, devices = registry.snapshot()
+        return Response(
+            {"version": version, "devices": devices},
+            headers={"ETag": f'"devices-{version}"'},
+        )
+
+
+class DeviceBatchView(APIView):
+    """
+    Несколько команд за один запрос и одну транзакцию:
+    [{"kind": "kalitka1", "state": true}, {"house": 2, "kind": "door", "entrance_no": 3, "state": true}]
+    """
+    permission_classes = []
+
+    def post(self, request):
+        commands = request.data.get("commands") if isinstance(request.data, dict) else request.data
+        serializer = DeviceCommandSerializer(data=commands, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        with acting_as(actor_of(request)):
+            states = registry.set_many(serializer.validated_data)
+        return Response([
+            {"house": house, "kind": kind, "entrance_no": no, "state": state}
+            for (house, kind, no), state in states.items()
+        ])
+
+
+# ---------- DEVICES: JOURNAL ----------
+
+class DeviceEventPagination(CursorPagination):
+    page_size = 100
+    ordering = "-created_at"
+
+
+class DeviceEventList(generics.ListAPIView):
+    """
+    История смен состояния: ?house=2&kind=door&entrance_no=3&since=<ISO>&until=<ISO>.
+    Курсорная пагинация, новые события первыми. Только администрации: это
+    расписание открытий всех подъездов и кто их открывал.
+    """
+    replica_reads = True
+    authentication_classes = IDENTITY_AUTHENTICATION
+    permission_classes = [IsAdministrator]
+    serializer_class = DeviceEventSerializer
+    pagination_class = DeviceEventPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = DeviceEvent.objects.select_related("device__house")
+
+        house = _int_param(params, "house")
+        if house is not None:
+            qs = qs.filter(device__house__number=house)
+        if params.get("kind"):
+            qs = qs.filter(device__kind=params["kind"])
+        entrance_no = _int_param(params, "entrance_no")
+        if entrance_no is not None:
+            qs = qs.filter(device__entrance_no=entrance_no)
+
+        for param, lookup in (("since", "created_at__gte"), ("until", "created_at__lt")):
+            if params.get(param):
+                try:
+                    # ValueError — формат верный, но дата невозможная (2026-13-40)
+                    value = parse_datetime(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise ValidationError({param: "Ожидается дата-время в формате ISO 8601"})
+                qs = qs.filter(**{lookup: value})
+        return qs
+
+
+# ---------- DEVICES: LONG-POLL ----------
+
+def _poll_params(request):
+    """since / timeout из query-параметров; timeout ограничен настройкой."""
+    try:
+        since = int(request.query_params.get("since", 0))
+    except (TypeError, ValueError):
+        since = 0
+    try:
+        timeout = float(request.query_params.get("timeout", settings.DEVICE_POLL_TIMEOUT))
+    except (TypeError, ValueError):
+        timeout = settings.DEVICE_POLL_TIMEOUT
+    return since, max(0.0, min(timeout, settings.DEVICE_POLL_TIMEOUT))
+
+
+class DeviceByEntrancePollView(APIView):
+    replica_reads = True
     permission_classes = []
 
-    def get(self, request, kind):
-        dev, _ = Device.objects.get_or_create(kind=kind, entrance_no=None)
-        return Response(dev.state)
+    def get(self, request, no, kind, house=None):
+        since, timeout = _poll_params(request)
+        state, version = registry.wait(kind, no, since, timeout, house)
+        return Response({"state": state, "version": version})
+
+
+class DeviceGlobalPollView(APIView):
+    replica_reads = True
+    permission_classes = []
+
+    def get(self, request, kind, house=None):
+        since, timeout = _poll_params(request)
+        state, version = registry.wait(kind, None, since, timeout, house)
+        return Response({"state": state, "version": version})
+
+
+# ---------- DEVICES: SSE (ASGI) ----------
+
+def _sse(state, version):
+    return f"id: {version}\nevent: state\ndata: {json.dumps({'state': state, 'version': version})}\n\n"
+
+
+async def _device_events(kind, no, house, since):
+    # подписываемся до чтения текущего состояния, чтобы не пропустить смену
+    queue = registry.subscribe(kind, no, house)
+    try:
+        state, last = await registry.aget_versioned(kind, no, house)
+        if last != since:
+            yield _sse(state, last)
+        heartbeat = settings.DEVICE_STREAM_HEARTBEAT
+        # смены из других процессов очередь не принесёт — registry проверяем по интервалу ChangeProbe
+        timeout = min(heartbeat, settings.PROCESS_CACHE_CHECK_INTERVAL or heartbeat)
+        idle = 0.0
+        while True:
+            try:
+                state, version = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                state, version = await registry.aget_versioned(kind, no, house)
+                if version <= last:
+                    idle += timeout
+                    if idle >= heartbeat:
+                        idle = 0.0
+                        yield ": ping\n\n"
+                    continue
+            if version > last:
+                last = version
+                idle = 0.0
+                yield _sse(state, version)
+    finally:
+        registry.unsubscribe(kind, no, queue, house)
+
+
+async def _stream_response(request, kind, no, house):
+    if not isinstance(request, ASGIRequest):
+        # под WSGI поток занимал бы рабочий поток сервера навсегда
+        return _json(
+            {"detail": "SSE доступен только под ASGI; используйте .../poll/ (long-poll)"}, status=501
+        )
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.GET.get("since", -1))
+    except ValueError:
+        since = -1
+    # неизвестный дом или тип устройства — 404 до начала потока, а не обрыв уже открытого ответа
+    await registry.aget_versioned(kind, no, house)
+    response = StreamingHttpResponse(
+        _device_events(kind, no, house, since), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class DeviceByEntranceStreamView(View):
+    async def get(self, request, no, kind, house=None):
+        return await _stream_response(request, kind, no, house)
+
+
+class DeviceGlobalStreamView(View):
+    async def get(self, request, kind, house=None):
+        return await _stream_response(request, kind, None, house)
+
+
+# ---------- ASYNC (ASGI) ----------
+
+def _json(data, status=200, **kwargs):
+    # как JSONRenderer у DRF: UTF-8 без \u-экранирования
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={"ensure_ascii": False}, **kwargs)
+
+
+class AsyncView(View):
+    """
+    Основа async-версий (DJANGO_ASYNC_VIEWS=1): под ASGI запрос не занимает
+    поток из пула sync_to_async. Как у APIView — без CSRF, тело и ошибки в JSON.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ValidationError as exc:
+            return _json(exc.detail, status=400)
+        except Http404 as exc:
+            return _json({"detail": str(exc) or "Страница не найдена."}, status=404)
+
+    @staticmethod
+    def data(request):
+        if request.content_type != "application/json":
+            return request.POST
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            raise ValidationError({"detail": "Некорректный JSON"})
+        return data if isinstance(data, dict) else {}
+
+
+class AsyncLoginView(AsyncView):
+    """LoginView на async ORM; ограничение попыток — те же лимитеры, что у LoginRateThrottle."""
+
+    async def post(self, request):
+        data = self.data(request)
+        login = data.get("login")
+
+        retry_after = login_retry_after(LoginRateThrottle().get_ident(request), login)
+        if retry_after:
+            return _json(
+                {"detail": Throttled(retry_after).detail},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": "%d" % retry_after},
+            )
+
+        user = await SimpleUser.objects.select_related("profile").filter(
+            login=login,
+            password=data.get("password"),
+            is_active=True
+        ).afirst()
+
+        if not user:
+            return _json({"message": "Неверный логин или пароль"}, status=401)
+
+        token, expires_in = issue_token(user)
+        return _json({
+            **SimpleUserSerializer(user).data,
+            "access": token,
+            "expires_in": expires_in,
+        })
+
+
+async def _adevice_command(request, kind, no, house, data):
+    pulse = _pulse_seconds(data.get("pulse"))
+    with acting_as(actor_of(request)):
+        if pulse:
+            return await registry.apulse(kind, no, data.get("state", True), pulse, house=house)
+        return await registry.aset(kind, no, data.get("state"), house=house)
+
+
+class AsyncDeviceByEntranceView(AsyncView):
+    replica_reads = True
+
+    async def get(self, request, no, kind, house=None):
+        return _json(await registry.aget(kind, no, house))
+
+    async def post(self, request, no, kind, house=None):
+        return _json(await _adevice_command(request, kind, no, house, self.data(request)))
+
+
+class AsyncDeviceGlobalView(AsyncView):
+    replica_reads = True
+
+    async def get(self, request, kind, house=None):
+        return _json(await registry.aget(kind, None, house))
 
-    def post(self, request, kind):
-        dev, _ = Device.objects.get_or_create(kind=kind, entrance_no=None)
-        dev.state = bool(request.data.get("state"))
-        dev.save()
-        return Response(dev.state)
+    async def post(self, request, kind, house=None):
+        return _json(await _adevice_command(request, kind, None, house, self.data(request)))
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .routers import primary
+
+logger = logging.getLogger(__name__)
+
+
+class SerialWriter:
+    """
+    Единственный писатель горячего пути (команды устройств).
+
+    В режиме DB_SERIAL_WRITER запись выполняется на отдельном потоке со своим
+    постоянным соединением, задачи — строго по очереди: писатели не спорят
+    за блокировку SQLite, а замок registry держится только на обновление
+    памяти, не на запись на диск. Без настройки (разработка, тесты) задача
+    выполняется в вызывающем потоке под общим замком — порядок тот же.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._inline_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.done = 0
+        self.failed = 0
+
+    @property
+    def threaded(self):
+        return getattr(settings, "DB_SERIAL_WRITER", False)
+
+    def submit(self, fn, *args):
+        """Future с результатом fn(*args)."""
+        future = Future()
+        if not self.threaded or threading.current_thread() is self._thread:
+            with self._inline_lock:
+                self._run_one(future, fn, args)
+            return future
+        if self._thread is None:
+            self._start()
+        # контекст вызывающего (кто меняет — api.journal.current_actor) едет вместе с задачей
+        self._queue.put((future, contextvars.copy_context(), fn, args))
+        return future
+
+    def call(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def acall(self, fn, *args):
+        """call() для async view: ждём поток писателя, не занимая поток из пула."""
+        if self.threaded:
+            return await asyncio.wrap_future(self.submit(fn, *args))
+        return await sync_to_async(self.call, thread_sensitive=False)(fn, *args)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _run_one(self, future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with primary():
+                result = fn(*args)
+        except Exception as exc:
+            self.failed += 1
+            future.set_exception(exc)
+        else:
+            self.done += 1
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            future, context, fn, args = self._queue.get()
+            try:
+                close_old_connections()
+            except Exception:
+                logger.exception("Писатель БД: не удалось проверить соединение")
+            context.run(self._run_one, future, fn, args)
+
+
+writer = SerialWriter()
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.MetricsMiddleware",  # первой: время ответа — вместе с остальными middleware
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -85,6 +86,52 @@ WSGI_APPLICATION = "aristokrat_backend.wsgi.application"
 
 DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": BASE_DIR / "db.sqlite3"}}
 
+# ============= SQLITE (PRODUCTION) =============
+# DJANGO_SQLITE_PRODUCTION=1: прагмы на каждое соединение, постоянные соединения,
+# BEGIN IMMEDIATE вместо DEFERRED (иначе при повышении блокировки чтение→запись
+# SQLite отвечает «database is locked», не дожидаясь busy_timeout)
+# и запись команд устройств через один поток (api/writer.py)
+SQLITE_PRODUCTION = os.getenv("DJANGO_SQLITE_PRODUCTION", "0") == "1"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # читатели не ждут писателя
+    "synchronous": "NORMAL",     # в WAL — без fsync на каждый коммит, целостность сохраняется
+    "busy_timeout": 5000,        # мс ожидания чужой блокировки
+    "cache_size": -64000,        # ~64 МБ страничного кэша на соединение
+    "mmap_size": 268435456,      # 256 МБ файла читаются через mmap
+    "temp_store": "MEMORY",
+}
+if SQLITE_PRODUCTION:
+    DATABASES["default"].update(
+        CONN_MAX_AGE=None,
+        CONN_HEALTH_CHECKS=True,
+        OPTIONS={
+            "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+            "transaction_mode": "IMMEDIATE",
+        },
+    )
+# Единственный поток записи для команд устройств; по умолчанию — вместе с режимом выше
+DB_SERIAL_WRITER = os.getenv("DJANGO_DB_SERIAL_WRITER", "1" if SQLITE_PRODUCTION else "0") == "1"
+
+# ============= ASGI =============
+# DJANGO_ASYNC_VIEWS=1: логин и команды устройств — async-версии (api/views.py, AsyncView);
+# имеет смысл только под ASGI (asgi.py), под WSGI каждая пойдёт через async_to_sync
+ASYNC_VIEWS = os.getenv("DJANGO_ASYNC_VIEWS", "0") == "1"
+
+# ============= READ REPLICAS =============
+# DJANGO_DB_REPLICAS="/srv/replica1.sqlite3,/srv/replica2.sqlite3" — копии default
+# (обновляет manage.py sync_replicas). Чтения списков и GET устройств идут на них
+# (api/routers.py), запись и чтение после записи в том же запросе — на default.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.getenv("DJANGO_DB_REPLICAS", "").split(",")), start=1):
+    alias = f"replica{number}"
+    DATABASES[alias] = {**DATABASES["default"], "NAME": name.strip(), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(alias)
+# Реплика, отстающая больше чем на столько секунд, пропускается
+REPLICA_MAX_LAG = float(os.getenv("DJANGO_REPLICA_MAX_LAG", "5"))
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+    MIDDLEWARE.insert(MIDDLEWARE.index("django.middleware.common.CommonMiddleware"), "api.routers.ReplicaMiddleware")
+
 AUTH_PASSWORD_VALIDATORS = []
 LANGUAGE_CODE = "ru-ru"
 TIME_ZONE = "Europe/Moscow"
@@ -93,12 +140,55 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"   # папка, куда collectstatic всё сложит
 
+# Bearer-токен (api.authentication.TokenAuthentication) подключается во view,
+# которым нужен пользователь (IDENTITY_AUTHENTICATION), не глобально
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    # IP клиента для ограничителей (get_ident): 0 — REMOTE_ADDR, X-Forwarded-For не читается;
+    # N — столько своих прокси перед Django, клиент — N-й адрес с конца X-Forwarded-For.
+    # Без числа DRF берёт заголовок целиком, и клиент обходит лимит по IP, подставляя свой.
+    "NUM_PROXIES": int(os.getenv("DJANGO_NUM_PROXIES", "0")),
+}
+
+# Токены LoginView (HS256 на SECRET_KEY) и кэш пользователя по токену
+AUTH_TOKEN_LIFETIME = timedelta(minutes=30)
+AUTH_IDENTITY_CACHE_TTL = 300  # сек
+
+# Кэши процесса (registry, справочник, поиск) раз в столько секунд проверяют, не меняли ли
+# их таблицы другие процессы (api/changes.py); 0 — не проверять, процесс один
+PROCESS_CACHE_CHECK_INTERVAL = float(os.getenv("DJANGO_PROCESS_CACHE_CHECK_INTERVAL", "1"))
+
+# Попытки входа: (сколько, за сколько секунд) по IP и по логину; MAX_KEYS — предел памяти
+LOGIN_THROTTLE = {
+    "IP": (30, 60),
+    "LOGIN": (5, 60),
+    "MAX_KEYS": 50_000,
 }
 
+# ============= DEVICES =============
+# Номер дома для маршрутов без дома (api/entrances/<no>/<kind>/, api/<kind>/) и команд
+# пачки без "house": старые контроллеры управляют устройствами этого дома.
+# Пусто — у таких маршрутов свои устройства без дома
+DEVICE_DEFAULT_HOUSE = int(os.getenv("DJANGO_DEVICE_DEFAULT_HOUSE", "1") or 0) or None
+# Максимальное время удержания long-poll запроса (сек)
+DEVICE_POLL_TIMEOUT = 25
+# Интервал keep-alive комментариев в SSE-потоке (сек)
+DEVICE_STREAM_HEARTBEAT = 15
+# Журнал событий: размер пачки и период сброса в БД (сек); 0 — без фонового потока
+DEVICE_JOURNAL_BATCH_SIZE = 200
+DEVICE_JOURNAL_FLUSH_INTERVAL = 1.0
+# Сколько событий держать в памяти, пока БД не принимает журнал
+DEVICE_JOURNAL_MAX_PENDING = 100_000
+# Импульс (pulse): длительность по умолчанию и верхний предел (сек)
+DEVICE_PULSE_SECONDS = 5
+DEVICE_PULSE_MAX = 60
+
+# ============= METRICS =============
+# /api/metrics (Prometheus); с токеном скрейпер шлёт Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv("DJANGO_METRICS_TOKEN", "")
+
 # ============= JAZZMIN CONFIG =============
 JAZZMIN_SETTINGS = {
     "site_title": "Аристократ",